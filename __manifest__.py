@@ -1,7 +1,7 @@
 # -*- coding: utf-8 -*-
 {
     'name': 'Platinum Project - Portal Approvals',
-    'version': '18.0.1.0.0',
+    'version': '18.0.1.1.0',
     'category': 'Human Resources/Approvals',
     'summary': 'Employee portal interface for approval requests',
     'description': """
@@ -30,6 +30,7 @@ Key Features:
         'purchase',       # Purchase order integration
         'stock',          # Inventory management
         'account',        # Budget tracking via analytic accounts
+        'bus',            # Live status updates on portal pages
     ],
     'data': [
         # Security
@@ -39,11 +40,17 @@ Key Features:
         # Data
         'data/cron_link_users.xml',
         'data/update_procurement_category.xml',
+        'data/cron_approval_jobs.xml',
+        'data/cron_merge_placeholders.xml',
         # 'data/approval_categories.xml',
 
         # Views
         'views/approval_request_views.xml',
+        'views/approval_budget_ledger_views.xml',
+        'views/approval_request_job_views.xml',
+        'views/approval_category_views.xml',
         'views/hr_employee_views.xml',
+        'views/purchase_order_views.xml',
         'views/portal_templates.xml',
 
         # Menu items
@@ -55,6 +62,7 @@ Key Features:
             'platinum_proj/static/src/scss/portal_style.scss',
         ],
     },
+    'post_init_hook': 'post_init_hook',
     'installable': True,
     'auto_install': False,
     'application': False,
@@ -1,83 +1,246 @@
 # -*- coding: utf-8 -*-
 
-from odoo import http, fields, _
+from odoo import http, fields, models, _
 from odoo.addons.portal.controllers.portal import CustomerPortal, pager as portal_pager
-from odoo.exceptions import AccessError, MissingError
+from odoo.addons.platinum_proj.tools import normalize_name
+from odoo.exceptions import AccessError, MissingError, UserError
+from odoo.fields import Command
 from odoo.http import request
-from odoo.tools import groupby as groupbyelem
+from odoo.osv import expression
 from collections import OrderedDict
+from datetime import datetime
+from urllib.parse import urlencode
+from psycopg2 import OperationalError
 import logging
 import base64
+import hashlib
+import json
+import time
 
 _logger = logging.getLogger(__name__)
 
+# Per-worker budget snapshots used by the portal form widgets:
+# {(dbname, company_id): (expires_at, snapshot)}
+_budget_snapshots = {}
+BUDGET_SNAPSHOT_TTL = 30  # seconds
 
+# Per-worker cached totals of large approval lists:
+# {(dbname, uid, domain): (expires_at, count)}
+_approval_counts = {}
+APPROVAL_COUNT_TTL = 300  # seconds
+APPROVAL_EXACT_COUNT_LIMIT = 1000
+
+# Default 'Units' UoM id per database, resolved once per worker
+_default_uom_ids = {}
+
+# Upload size limits, overridable with system parameters (in MB)
+UPLOAD_MAX_FILE_SIZE_MB = 64
+UPLOAD_MAX_REQUEST_SIZE_MB = 128
 
 
 class EmployeePortal(CustomerPortal):
 
     @http.route()
     def home(self, **kw):
-        """Override portal home to include approval counts"""
-        return super().home(**kw)
+        """Override portal home to show the employee section to employees"""
+        response = super().home(**kw)
+        response.qcontext['is_employee_user'] = self._is_employee_user()
+        return response
 
     def _prepare_home_portal_values(self, counters):
-        """Add approval requests to portal counters"""
-        values = super()._prepare_home_portal_values(counters)
+        """Add approval requests to portal counters
 
-        # Check if current user is an employee
-        is_employee_user = self._is_employee_user()
-        values['is_employee_user'] = is_employee_user
+        ``approval_count`` is the total of the current user's requests,
+        only counted when requested.
+        """
+        values = super()._prepare_home_portal_values(counters)
 
-        # Add approval count only for employee users
-        if is_employee_user:
-            try:
-                approval_count = request.env['approval.request'].search_count([
-                    ('request_owner_id', '=', request.env.user.id)
-                ])
-                values['approval_count'] = approval_count
-            except:
-                values['approval_count'] = 0
-        else:
-            values['approval_count'] = 0
+        if 'approval_count' in counters:
+            values['approval_count'] = (
+                request.env['approval.request']._get_portal_request_count(request.env.user)
+                if self._is_employee_user() else 0
+            )
 
         return values
 
+    def _get_current_employee(self):
+        """Return the (sudo) employee linked to the current user, possibly empty"""
+        user = request.env.user
+        if not user or user._is_public():
+            return request.env['hr.employee'].sudo().browse()
+        return request.env['hr.employee']._get_employee_for_user(user)
+
     def _is_employee_user(self):
         """Check if current user is linked to an employee record"""
-        if not request.env.user or request.env.user._is_public():
-            _logger.info(f"User check failed: user={request.env.user}, is_public={request.env.user._is_public() if request.env.user else 'No user'}")
-            return False
-
-        user_id = request.env.user.id
-        user_email = request.env.user.email
-
-        # Check if user has employee record (direct link or email match)
-        employee = request.env['hr.employee'].search([
-            '|',
-            ('user_id', '=', user_id),
-            ('work_email', '=', user_email)
-        ], limit=1)
-
-        _logger.info(f"Employee check for user {user_id} ({user_email}): employee found={bool(employee)}")
-        if employee:
-            _logger.info(f"Employee found: {employee.name} (id={employee.id})")
-
+        employee = self._get_current_employee()
+        _logger.debug("Employee check for user %s: employee=%s", request.env.user.id, employee.id)
         return bool(employee)
 
     def _get_approval_domain(self):
         """Get domain for user's approval requests"""
         return [('request_owner_id', '=', request.env.user.id)]
 
+    def _get_approval_groups(self, domain, group_field, order, url_args):
+        """Return the groups of the approvals list, with real counts
+
+        :return: list of dicts with ``label``, ``count``, ``approvals`` (first
+                 page of the group) and ``url`` (paginated view of the group)
+        """
+        ApprovalRequest = request.env['approval.request']
+        groups = ApprovalRequest._read_group(domain, [group_field], ['__count'])
+        if group_field == 'request_status':
+            status_order = [value for value, _label in ApprovalRequest._fields['request_status'].selection]
+            groups.sort(key=lambda g: status_order.index(g[0]) if g[0] in status_order else len(status_order))
+
+        approval_groups = []
+        for value, count in groups:
+            key = value.id if group_field == 'category_id' else value
+            approval_groups.append({
+                'label': self._get_approval_group_label(group_field, value),
+                'count': count,
+                'approximate': False,
+                'approvals': ApprovalRequest.search(
+                    domain + [(group_field, '=', key)], order=order, limit=self._items_per_page),
+                'url': '/my/approvals?%s' % urlencode(
+                    {k: v for k, v in dict(url_args, group=key).items() if v}),
+            })
+        return approval_groups
+
+    def _get_approval_group_label(self, group_field, value):
+        """Return the display label of a status or category group"""
+        if group_field == 'category_id':
+            category = value if isinstance(value, models.BaseModel) else request.env['approval.category'].browse(value)
+            return category.name or _('None')
+        selection = dict(request.env['approval.request']._fields['request_status']._description_selection(request.env))
+        return selection.get(value, value)
+
+    def _get_approval_count(self, domain):
+        """Return ``(count, exact)`` for the approvals list
+
+        Counting stops at ``platinum_proj.approvals_exact_count_limit``
+        rows; above it the total is approximate: a full count cached per
+        user and domain for a few minutes.
+        """
+        ApprovalRequest = request.env['approval.request']
+        limit = int(request.env['ir.config_parameter'].sudo().get_param(
+            'platinum_proj.approvals_exact_count_limit', APPROVAL_EXACT_COUNT_LIMIT))
+        count = ApprovalRequest.search_count(domain, limit=limit + 1)
+        if count <= limit:
+            return count, True
+
+        key = (request.env.cr.dbname, request.env.uid, repr(domain))
+        now = time.monotonic()
+        cached = _approval_counts.get(key)
+        if cached and cached[0] > now:
+            return cached[1], False
+        count = ApprovalRequest.search_count(domain)
+        for expired_key in [k for k, (expires_at, _count) in _approval_counts.items() if expires_at <= now]:
+            del _approval_counts[expired_key]
+        _approval_counts[key] = (now + APPROVAL_COUNT_TTL, count)
+        return count, False
+
+    def _keyset_page(self, domain, keys, url_args, after=None, before=None):
+        """Return a page of approvals after/before a cursor, and its pager
+
+        :param keys: list of ``(field name, 'asc'|'desc')``, unique overall
+        :return: ``(approvals, keyset_pager)`` where the pager holds the
+                 ``previous_url`` and ``next_url`` of the adjacent pages
+        """
+        ApprovalRequest = request.env['approval.request']
+        step = self._items_per_page
+        cursor = self._decode_cursor(before or after, keys)
+        backward = bool(before and cursor)
+
+        order_keys = keys
+        if backward:
+            order_keys = [(fname, 'asc' if direction == 'desc' else 'desc') for fname, direction in keys]
+        page_domain = domain
+        if cursor:
+            page_domain = expression.AND([domain, self._keyset_domain(order_keys, cursor)])
+
+        approvals = ApprovalRequest.search(
+            page_domain,
+            order=', '.join(f'{fname} {direction}' for fname, direction in order_keys),
+            limit=step + 1,
+        )
+        has_more = len(approvals) > step
+        approvals = approvals[:step]
+        if backward:
+            approvals = approvals[::-1]
+            has_previous, has_next = has_more, True
+        else:
+            has_previous, has_next = bool(cursor), has_more
+
+        def page_url(**cursor_arg):
+            args = {k: v for k, v in dict(url_args, **cursor_arg).items() if v}
+            return '/my/approvals?%s' % urlencode(args)
+
+        return approvals, {
+            'previous_url': page_url(before=self._encode_cursor(approvals[0], keys))
+                            if has_previous and approvals else False,
+            'next_url': page_url(after=self._encode_cursor(approvals[-1], keys))
+                        if has_next and approvals else False,
+        }
+
+    def _keyset_domain(self, keys, cursor):
+        """Domain of the rows strictly after ``cursor`` in ``keys`` order"""
+        domains = []
+        for index, (fname, direction) in enumerate(keys):
+            domains.append(expression.AND(
+                [[(prev_fname, '=', cursor[i])] for i, (prev_fname, _dir) in enumerate(keys[:index])]
+                + [[(fname, '>' if direction == 'asc' else '<', cursor[index])]]
+            ))
+        return expression.OR(domains)
+
+    def _encode_cursor(self, record, keys):
+        """Return the URL-safe cursor token of a record for ``keys``"""
+        values = []
+        for fname, _direction in keys:
+            value = record[fname]
+            if isinstance(value, datetime):
+                # keep the microseconds, rows created in the same second
+                # would otherwise be skipped or repeated across pages
+                value = value.isoformat()
+            values.append(value)
+        return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+    def _decode_cursor(self, token, keys):
+        """Return the key values of a cursor token, or None when invalid"""
+        if not token:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(token.encode()))
+        except ValueError:
+            return None
+        if not isinstance(values, list) or len(values) != len(keys):
+            return None
+        model_fields = request.env['approval.request']._fields
+        for index, (fname, _direction) in enumerate(keys):
+            if model_fields[fname].type == 'datetime' and values[index]:
+                try:
+                    values[index] = datetime.fromisoformat(values[index])
+                except (TypeError, ValueError):
+                    return None
+        return values
+
     @http.route(['/my/approvals', '/my/approvals/page/<int:page>'],
                 type='http', auth="user", website=True)
     def portal_my_approvals(self, page=1, date_begin=None, date_end=None,
                            sortby=None, search=None, search_in='content',
-                           groupby='none', filterby='all', **kw):
-        """Employee portal page for approval requests"""
+                           groupby='none', filterby='all', group=None,
+                           after=None, before=None, **kw):
+        """Employee portal page for approval requests
+
+        When grouped, each group shows its real count and first page; the
+        ``group`` parameter selects one group to paginate through.
+
+        Large lists switch to keyset pagination: ``after``/``before`` are
+        cursor tokens of the last/first row of the adjacent page, and the
+        total is approximate.
+        """
         # Check if user is an employee
         if not self._is_employee_user():
-            _logger.info(f"Access denied to /my/approvals for user {request.env.user.id} - not an employee")
+            _logger.debug("Access denied to /my/approvals for user %s - not an employee", request.env.user.id)
             return request.redirect('/my')
 
         values = self._prepare_portal_layout_values()
@@ -85,10 +248,17 @@ class EmployeePortal(CustomerPortal):
 
         domain = self._get_approval_domain()
 
+        # ``keys`` is the (create_date, id) tie-broken order used for keyset pagination
         searchbar_sortings = {
-            'date': {'label': _('Newest'), 'order': 'create_date desc'},
-            'name': {'label': _('Subject'), 'order': 'name'},
-            'status': {'label': _('Status'), 'order': 'request_status'},
+            'date': {'label': _('Newest'), 'order': 'create_date desc',
+                     'keys': [('create_date', 'desc'), ('id', 'desc')]},
+            'name': {'label': _('Subject'), 'order': 'name',
+                     'keys': [('name', 'asc'), ('create_date', 'desc'), ('id', 'desc')]},
+            'status': {'label': _('Status'), 'order': 'request_status',
+                       'keys': [('request_status', 'asc'), ('create_date', 'desc'), ('id', 'desc')]},
+            # Only applies to content searches; pages with offsets
+            'relevance': {'label': _('Relevance'), 'order': 'create_date desc',
+                          'keys': [('create_date', 'desc'), ('id', 'desc')]},
         }
 
         searchbar_filters = {
@@ -100,7 +270,7 @@ class EmployeePortal(CustomerPortal):
         }
 
         searchbar_inputs = {
-            'content': {'input': 'content', 'label': _('Search <span class="nolabel"> (in Content)</span>')},
+            'content': {'input': 'content', 'label': _('Search <span class="nolabel"> (in Subject, Reference and Description)</span>')},
             'name': {'input': 'name', 'label': _('Search in Subject')},
             'status': {'input': 'status', 'label': _('Search in Status')},
         }
@@ -111,9 +281,13 @@ class EmployeePortal(CustomerPortal):
             'category': {'input': 'category_id', 'label': _('Category')},
         }
 
-        # default sort
+        content_search = bool(search) and search_in in ('content', 'all')
+
+        # default sort: by relevance when searching the content
+        if sortby not in searchbar_sortings or (sortby == 'relevance' and not content_search):
+            sortby = None
         if not sortby:
-            sortby = 'date'
+            sortby = 'relevance' if content_search else 'date'
         order = searchbar_sortings[sortby]['order']
 
         # default filter
@@ -124,46 +298,92 @@ class EmployeePortal(CustomerPortal):
         # search
         if search and search_in:
             search_domain = []
-            if search_in in ('content', 'all'):
-                search_domain = ['|', ('name', 'ilike', search), ('reason', 'ilike', search)]
+            if content_search:
+                # Full-text over name, reference and reason
+                search_domain = ApprovalRequest._get_portal_search_domain(search)
             elif search_in == 'name':
                 search_domain = [('name', 'ilike', search)]
             elif search_in == 'status':
-                search_domain = [('request_status', 'ilike', search)]
+                # Match the status labels rather than the stored keys
+                statuses = ApprovalRequest._fields['request_status']._description_selection(request.env)
+                search_domain = [('request_status', 'in', [
+                    value for value, label in statuses if search.lower() in label.lower()
+                ])]
             domain += search_domain
 
-        # count for pager
-        approval_count = ApprovalRequest.search_count(domain)
-
-        # pager
-        pager = portal_pager(
-            url="/my/approvals",
-            url_args={'date_begin': date_begin, 'date_end': date_end,
-                     'sortby': sortby, 'groupby': groupby, 'search_in': search_in,
-                     'search': search, 'filterby': filterby},
-            total=approval_count,
-            page=page,
-            step=self._items_per_page
-        )
-
-        # content according to pager and archive selected
-        approvals = ApprovalRequest.search(domain, order=order,
-                                         limit=self._items_per_page,
-                                         offset=pager['offset'])
-        request.session['my_approvals_history'] = approvals.ids[:100]
-
         groupby_mapping = {
             'status': 'request_status',
             'category': 'category_id',
         }
-
-        if groupby in groupby_mapping:
-            grouped_approvals = [
-                ApprovalRequest.concat(*g)
-                for k, g in groupbyelem(approvals, itemgetter=lambda x: x[groupby_mapping[groupby]])
-            ]
+        group_field = groupby_mapping.get(groupby)
+        url_args = {'date_begin': date_begin, 'date_end': date_end,
+                    'sortby': sortby, 'groupby': groupby, 'search_in': search_in,
+                    'search': search, 'filterby': filterby}
+
+        if group_field == 'category_id' and group and not group.isdigit():
+            group = None
+
+        keyset_pager = False
+        if group_field and not group:
+            # Overview: real counts per group from one grouped query, and
+            # the first page of each group
+            grouped_approvals = self._get_approval_groups(
+                domain, group_field, order, url_args)
+            pager = portal_pager(url="/my/approvals", total=0, page=1, step=self._items_per_page)
+            approvals = ApprovalRequest.concat(*(g['approvals'] for g in grouped_approvals))
         else:
-            grouped_approvals = [approvals]
+            group_label = False
+            if group_field:
+                # Paginate within the selected group
+                group_value = int(group) if group_field == 'category_id' else group
+                domain += [(group_field, '=', group_value)]
+                url_args['group'] = group
+                group_label = self._get_approval_group_label(group_field, group_value)
+
+            approval_count, count_exact = self._get_approval_count(domain)
+            keys = searchbar_sortings[sortby]['keys']
+            if sortby == 'relevance':
+                pager = portal_pager(
+                    url="/my/approvals",
+                    url_args=url_args,
+                    total=approval_count,
+                    page=page,
+                    step=self._items_per_page
+                )
+                approvals = ApprovalRequest._portal_search_ranked(
+                    domain, search, limit=self._items_per_page, offset=pager['offset'])
+            elif after or before or not count_exact:
+                approvals, keyset_pager = self._keyset_page(
+                    domain, keys, url_args, after=after, before=before)
+                keyset_pager.update(total=approval_count, approximate=not count_exact)
+                pager = portal_pager(url="/my/approvals", total=0, page=1, step=self._items_per_page)
+            else:
+                # pager
+                pager = portal_pager(
+                    url="/my/approvals",
+                    url_args=url_args,
+                    total=approval_count,
+                    page=page,
+                    step=self._items_per_page
+                )
+
+                # content according to pager and archive selected
+                approvals = ApprovalRequest.search(domain, order=order,
+                                                 limit=self._items_per_page,
+                                                 offset=pager['offset'])
+            grouped_approvals = [{
+                'label': group_label,
+                'count': approval_count,
+                'approximate': not count_exact,
+                'approvals': approvals,
+                'url': False,
+            }] if approvals else []
+
+        # Read what the template displays for all cards at once
+        approvals.fetch(['name', 'category_id', 'request_status', 'create_date', 'amount', 'company_id'])
+        approvals.category_id.fetch(['name'])
+        approvals.company_id.fetch(['currency_id'])
+        request.session['my_approvals_history'] = approvals.ids[:100]
 
         values.update({
             'date': date_begin,
@@ -173,6 +393,7 @@ class EmployeePortal(CustomerPortal):
             'archive_groups': [],
             'default_url': '/my/approvals',
             'pager': pager,
+            'keyset_pager': keyset_pager,
             'searchbar_sortings': searchbar_sortings,
             'searchbar_groupby': searchbar_groupby,
             'searchbar_inputs': searchbar_inputs,
@@ -185,6 +406,34 @@ class EmployeePortal(CustomerPortal):
         })
         return request.render("platinum_proj.portal_my_approvals", values)
 
+    @http.route(['/my/approval/status'], type='json', auth="user", website=True)
+    def portal_approval_status(self, versions=None, **kw):
+        """Return the requests whose status changed since the client's versions
+
+        :param versions: ``{request_id: status_version}`` last seen by the
+                         page, for up to 200 of the user's requests
+        :return: ``{'requests': [...]}`` with only the changed requests; an
+                 unchanged poll is a single primary-key read
+        """
+        if not isinstance(versions, dict):
+            versions = {}
+        parsed = {}
+        for request_id, version in list(versions.items())[:200]:
+            try:
+                parsed[int(request_id)] = int(version or 0)
+            except (TypeError, ValueError):
+                continue
+        versions = parsed
+        if not versions:
+            return {'requests': []}
+
+        approvals = request.env['approval.request'].sudo().search_fetch(
+            self._get_approval_domain() + [('id', 'in', list(versions))],
+            ['status_version'],
+        )
+        changed = approvals.filtered(lambda a: a.status_version != versions[a.id])
+        return {'requests': changed._get_portal_status_values()}
+
     @http.route(['/my/approval/<int:approval_id>'], type='http', auth="user", website=True)
     def portal_approval_detail(self, approval_id, access_token=None, **kw):
         """Detail view for specific approval request"""
@@ -216,6 +465,12 @@ class EmployeePortal(CustomerPortal):
         category = approval_sudo.category_id
 
         if request.httprequest.method == 'POST':
+            # Reject oversized uploads before processing anything
+            uploads = self._get_uploaded_files()
+            # Serialize on the budget row before the heavy work
+            request.env['approval.request'].sudo()._lock_budget_ledger(
+                approval_sudo.budget_line_id, approval_sudo.company_id)
+
             # Process form submission for edit
             vals = {}
 
@@ -241,74 +496,53 @@ class EmployeePortal(CustomerPortal):
             if post.get('date_end'):
                 vals['date_end'] = fields.Datetime.from_string(post.get('date_end'))
 
-            # Handle product lines
-            approval_sudo.product_line_ids.unlink()  # Clear existing
-            product_lines = []
-
-            product_names = request.httprequest.form.getlist('product_name[]')
-            product_ids = request.httprequest.form.getlist('product_id[]')
-            product_descriptions = request.httprequest.form.getlist('product_description[]')
-            product_quantities = request.httprequest.form.getlist('product_quantity[]')
-            product_uoms = request.httprequest.form.getlist('product_uom[]')
+            # Handle product lines: match submitted rows to existing lines by
+            # their line key and only send commands for what changed
+            existing_lines = {line.id: line for line in approval_sudo.product_line_ids}
+            kept_line_ids = set()
+            line_commands = []
 
-            for i, product_name in enumerate(product_names):
-                if not product_name.strip():
-                    continue
+            rows = self._parse_product_line_rows()
+            self._resolve_product_line_rows(rows, company=approval_sudo.company_id)
 
-                product_id = product_ids[i] if i < len(product_ids) and product_ids[i] else None
-                description = product_descriptions[i] if i < len(product_descriptions) else product_name
-                quantity = float(product_quantities[i]) if i < len(product_quantities) and product_quantities[i] else 1.0
-
-                # Get UOM - either from existing product or form input
-                if product_id:
-                    # Get UOM from existing product
-                    existing_product = request.env['product.product'].sudo().browse(int(product_id))
-                    uom_id = existing_product.sudo().uom_id.id if existing_product.exists() and existing_product.sudo().uom_id else None
-                else:
-                    # Use form input or get default UOM
-                    uom_id = int(product_uoms[i]) if i < len(product_uoms) and product_uoms[i] else None
-
-                # Get default UOM if still None
-                if not uom_id:
-                    default_uom = request.env['uom.uom'].sudo().search([('name', '=', 'Units')], limit=1)
-                    uom_id = default_uom.id if default_uom else 1
-
-                if not product_id:
-                    # Create new product
-                    product_vals = {
-                        'name': product_name.strip(),
-                        'type': 'consu',
-                        'categ_id': 1,
-                        'uom_id': uom_id,
-                        'uom_po_id': uom_id,
-                    }
-                    new_product = request.env['product.product'].sudo().create(product_vals)
-                    product_id = new_product.id
+            for row in rows:
+                line = existing_lines.get(int(row['line_key'])) if row['line_key'].isdigit() else None
+                if line and line.id in kept_line_ids:
+                    # Duplicated key: treat the row as a new line
+                    line = None
 
                 line_vals = {
-                    'description': description.strip() if description else product_name.strip(),
-                    'quantity': quantity,
-                    'product_id': int(product_id),
+                    'description': row['description'],
+                    'quantity': row['quantity'],
+                    'product_id': row['product'].id,
                 }
-                product_lines.append((0, 0, line_vals))
 
-            if product_lines:
-                vals['product_line_ids'] = product_lines
+                if line:
+                    kept_line_ids.add(line.id)
+                    changes = self._get_product_line_changes(line, line_vals)
+                    if changes:
+                        line_commands.append(Command.update(line.id, changes))
+                else:
+                    line_commands.append(Command.create(line_vals))
+
+            line_commands += [
+                Command.delete(line_id) for line_id in existing_lines if line_id not in kept_line_ids
+            ]
+            if line_commands:
+                vals['product_line_ids'] = line_commands
 
             # Update the request
             approval_sudo.write(vals)
 
             # Handle file attachments if any
-            if request.httprequest.files:
-                for file_key, file in request.httprequest.files.items():
-                    if file.filename:
-                        attachment_vals = {
-                            'name': file.filename,
-                            'datas': base64.b64encode(file.read()),
-                            'res_model': 'approval.request',
-                            'res_id': approval_sudo.id,
-                        }
-                        request.env['ir.attachment'].sudo().create(attachment_vals)
+            Attachment = request.env['ir.attachment'].sudo()
+            for file_key, file in uploads:
+                Attachment._create_from_stream(file.stream, {
+                    'name': file.filename,
+                    'res_model': 'approval.request',
+                    'res_id': approval_sudo.id,
+                    'approval_role': 'quotation' if 'quotation' in file_key.lower() else 'supporting',
+                })
 
             # Submit the request
             approval_sudo.action_confirm()
@@ -318,13 +552,10 @@ class EmployeePortal(CustomerPortal):
         # GET request - show edit form
         if approval_sudo.request_status == 'pending':
             approval_sudo.request_status = 'new'
-        partners = request.env['res.partner'].sudo().search([
-            ('is_company', '=', True)
-        ], limit=100)
-
+        # Vendors are searched remotely; only the selected one is rendered
         values = {
             'category': category,
-            'partners': partners,
+            'selected_vendor': approval_sudo.partner_id,
             'approval': approval_sudo,
             'edit_mode': True,
             'page_name': 'approval',
@@ -332,6 +563,148 @@ class EmployeePortal(CustomerPortal):
 
         return request.render("platinum_proj.portal_approval_new", values)
 
+    def _parse_product_line_rows(self):
+        """Parse the ``product_*[]`` form arrays into one dict per filled row"""
+        form = request.httprequest.form
+        arrays = {
+            key: form.getlist(f'product_{key}[]')
+            for key in ('name', 'id', 'description', 'quantity', 'price', 'vendor_id', 'uom', 'line_key')
+        }
+
+        def to_int(value):
+            return int(value) if value and value.isdigit() else False
+
+        rows = []
+        for i, product_name in enumerate(arrays['name']):
+            if not product_name.strip():
+                continue
+            row = {key: values[i] if i < len(values) else '' for key, values in arrays.items()}
+            rows.append({
+                'name': product_name.strip(),
+                'product_id': to_int(row['id']),
+                'description': (row['description'] or product_name).strip(),
+                'quantity': float(row['quantity']) if row['quantity'] else 1.0,
+                'price': float(row['price']) if row['price'] else 0.0,
+                'vendor_id': to_int(row['vendor_id']),
+                'uom_id': to_int(row['uom']),
+                'line_key': row['line_key'],
+            })
+        return rows
+
+    def _get_default_uom_id(self):
+        """Return the 'Units' UoM id, looked up once per worker and database"""
+        dbname = request.env.cr.dbname
+        if dbname not in _default_uom_ids:
+            default_uom = request.env['uom.uom'].sudo().search([('name', '=', 'Units')], limit=1)
+            _default_uom_ids[dbname] = default_uom.id or 1
+        return _default_uom_ids[dbname]
+
+    def _resolve_product_line_rows(self, rows, product_defaults=None, company=None):
+        """Set ``row['product']`` on parsed rows
+
+        Referenced products and UoMs are checked with one query each.
+        Free-text rows reuse an existing product with the same normalized
+        name in ``company`` (the current one by default); the others get a
+        placeholder product, all created in a single call.
+
+        :param product_defaults: extra values of the created products
+        """
+        Product = request.env['product.product'].sudo()
+        products = Product.browse({row['product_id'] for row in rows if row['product_id']}).exists()
+        products.fetch(['product_tmpl_id'])
+        uom_ids = set(request.env['uom.uom'].sudo().browse(
+            {row['uom_id'] for row in rows if row['uom_id']}).exists().ids)
+        default_uom_id = self._get_default_uom_id()
+
+        product_ids = set(products.ids)
+        free_text_rows = [row for row in rows if row['product_id'] not in product_ids]
+        # Free-text lines reuse the product of the same normalized name
+        products_by_key = Product._find_portal_products(
+            (row['name'] for row in free_text_rows), company=company)
+
+        rows_by_new_key = {}
+        for row in rows:
+            if row['product_id'] in product_ids:
+                row['product'] = Product.browse(row['product_id'])
+                continue
+            key = normalize_name(row['name'])
+            if key in products_by_key:
+                row['product'] = products_by_key[key]
+            else:
+                rows_by_new_key.setdefault(key or row['name'], []).append(row)
+
+        # One placeholder product per new name, flagged for the merge job
+        new_keys = list(rows_by_new_key)
+        new_products = Product.create([{
+            'name': first_row['name'],
+            'type': 'consu',
+            'uom_id': first_row['uom_id'] if first_row['uom_id'] in uom_ids else default_uom_id,
+            'uom_po_id': first_row['uom_id'] if first_row['uom_id'] in uom_ids else default_uom_id,
+            'is_portal_placeholder': True,
+            **(product_defaults or {}),
+        } for first_row in (rows_by_new_key[key][0] for key in new_keys)])
+        for key, product in zip(new_keys, new_products):
+            for row in rows_by_new_key[key]:
+                row['product'] = product
+        return rows
+
+    def _resolve_supplier_infos(self, rows):
+        """Set ``row['supplier_info']`` on rows with a vendor
+
+        Existing (vendor, template) supplier infos are read in one search
+        and the missing ones created in one call. Unknown vendors are
+        dropped from their row.
+        """
+        vendor_ids = set(request.env['res.partner'].sudo().browse(
+            {row['vendor_id'] for row in rows if row['vendor_id']}).exists().ids)
+        vendor_rows = []
+        for row in rows:
+            if row['vendor_id'] not in vendor_ids:
+                row['vendor_id'] = False
+            else:
+                vendor_rows.append(row)
+        if not vendor_rows:
+            return rows
+
+        SupplierInfo = request.env['product.supplierinfo'].sudo()
+        supplier_info_by_pair = {}
+        for supplier_info in SupplierInfo.search([
+            ('partner_id', 'in', list(vendor_ids)),
+            ('product_tmpl_id', 'in', list({row['product'].product_tmpl_id.id for row in vendor_rows})),
+        ]):
+            supplier_info_by_pair.setdefault(
+                (supplier_info.partner_id.id, supplier_info.product_tmpl_id.id), supplier_info)
+
+        missing = {}
+        for row in vendor_rows:
+            pair = (row['vendor_id'], row['product'].product_tmpl_id.id)
+            if pair not in supplier_info_by_pair and pair not in missing:
+                missing[pair] = row['price']
+        created = SupplierInfo.create([{
+            'partner_id': partner_id,
+            'product_tmpl_id': product_tmpl_id,
+            'min_qty': 1.0,
+            'price': price if price > 0 else 0.0,
+            'currency_id': request.env.company.currency_id.id,
+            'company_id': request.env.company.id,
+        } for (partner_id, product_tmpl_id), price in missing.items()])
+        supplier_info_by_pair.update(zip(missing, created))
+
+        for row in vendor_rows:
+            row['supplier_info'] = supplier_info_by_pair[(row['vendor_id'], row['product'].product_tmpl_id.id)]
+        return rows
+
+    def _get_product_line_changes(self, line, line_vals):
+        """Return the values of ``line_vals`` that differ from ``line``"""
+        changes = {}
+        for fname, value in line_vals.items():
+            current = line[fname]
+            if isinstance(current, models.BaseModel):
+                current = current.id
+            if current != value:
+                changes[fname] = value
+        return changes
+
     @http.route(['/my/approval/new'], type='http', auth="user", website=True)
     def portal_approval_categories(self, **kw):
         """Show available approval categories"""
@@ -354,6 +727,12 @@ class EmployeePortal(CustomerPortal):
             return request.redirect('/my/approval/new')
 
         if request.httprequest.method == 'POST':
+            # Reject oversized uploads before processing anything
+            uploads = self._get_uploaded_files()
+            # Serialize on the budget row before the heavy work
+            request.env['approval.request'].sudo()._lock_budget_ledger(
+                category.budget_line_id, request.env.company)
+
             # Process form submission for new request
             vals = {
                 'name': post.get('name'),
@@ -365,11 +744,7 @@ class EmployeePortal(CustomerPortal):
             # Handle stock requisition auto-location assignment
             if category.name == 'Stock Requisition':
                 # Auto-assign employee's location as destination
-                employee = request.env['hr.employee'].search([
-                    '|',
-                    ('user_id', '=', request.env.user.id),
-                    ('work_email', '=', request.env.user.email)
-                ], limit=1)
+                employee = self._get_current_employee()
 
                 if employee:
                     # Try to find or create a location for the employee
@@ -418,131 +793,52 @@ class EmployeePortal(CustomerPortal):
                 vendor_phone = post.get('vendor_phone', '').strip()
 
                 if vendor_name:
-                    # Try to find existing vendor first
-                    existing_vendor = request.env['res.partner'].sudo().search([
-                        ('name', '=ilike', vendor_name),
-                        ('is_company', '=', True)
-                    ], limit=1)
+                    # Find existing vendor by normalized name, or create it
+                    vendor, _created = request.env['res.partner'].sudo()._find_or_create_vendor(
+                        vendor_name, email=vendor_email, phone=vendor_phone)
+                    vals['partner_id'] = vendor.id
+
+            # Handle product lines if any (equipment/items): all rows are
+            # parsed, then products, UoMs and supplier infos resolved in bulk
+            rows = self._parse_product_line_rows()
+            if rows:
+                self._resolve_product_line_rows(rows, product_defaults={
+                    'sale_ok': False,
+                    'purchase_ok': True,
+                    'is_storable': True,
+                })
+                is_purchase = category.approval_type == 'purchase'
+                if is_purchase:
+                    self._resolve_supplier_infos(rows)
 
-                    if existing_vendor:
-                        vals['partner_id'] = existing_vendor.id
-                    else:
-                        # Create new vendor
-                        vendor_vals = {
-                            'name': vendor_name,
-                            'is_company': True,
-                            'supplier_rank': 1,
-                            'customer_rank': 0,
-                        }
-                        if vendor_email:
-                            vendor_vals['email'] = vendor_email
-                        if vendor_phone:
-                            vendor_vals['phone'] = vendor_phone
-
-                        new_vendor = request.env['res.partner'].sudo().create(vendor_vals)
-                        vals['partner_id'] = new_vendor.id
-
-            # Handle product lines if any (equipment/items)
-            # Get form data using request.httprequest to access form arrays
-            product_names = request.httprequest.form.getlist('product_name[]')
-            product_ids = request.httprequest.form.getlist('product_id[]')
-            product_descriptions = request.httprequest.form.getlist('product_description[]')
-            product_quantities = request.httprequest.form.getlist('product_quantity[]')
-            product_prices = request.httprequest.form.getlist('product_price[]')
-            product_vendor_ids = request.httprequest.form.getlist('product_vendor_id[]')
-            product_uoms = request.httprequest.form.getlist('product_uom[]')
-
-            # Debug logging
-            _logger.info(f"Product vendor IDs submitted: {product_vendor_ids}")
-            _logger.info(f"Product prices submitted: {product_prices}")
-
-            if product_names:
                 product_lines = []
-                for i, product_name in enumerate(product_names):
-                    if product_name and product_name.strip():
-                        # Get corresponding values for this line
-                        product_id = product_ids[i] if i < len(product_ids) and product_ids[i] else None
-                        description = product_descriptions[i] if i < len(product_descriptions) else product_name
-                        quantity = float(product_quantities[i]) if i < len(product_quantities) and product_quantities[i] else 1.0
-                        price = float(product_prices[i]) if i < len(product_prices) and product_prices[i] else 0.0
-                        vendor_id = int(product_vendor_ids[i]) if i < len(product_vendor_ids) and product_vendor_ids[i] else None
-
-                        # Get UOM - either from existing product or form input
-                        if product_id:
-                            # Get UOM from existing product
-                            existing_product = request.env['product.product'].sudo().browse(int(product_id))
-                            uom_id = existing_product.sudo().uom_id.id if existing_product.exists() and existing_product.sudo().uom_id else None
-                        else:
-                            # Use form input or get default UOM
-                            uom_id = int(product_uoms[i]) if i < len(product_uoms) and product_uoms[i] else None
-
-                        # Get default UOM if still None
-                        if not uom_id:
-                            default_uom = request.env['uom.uom'].sudo().search([('name', '=', 'Units')], limit=1)
-                            uom_id = default_uom.id if default_uom else 1
-
-                        # Create new product if no product_id provided
-                        if not product_id:
-                            product_vals = {
-                                'name': product_name.strip(),
-                                'type': 'consu',  # Consumable product type
-                                'categ_id': 1,  # Default product category
-                                'uom_id': uom_id,
-                                'uom_po_id': uom_id,
-                                'sale_ok': False,
-                                'purchase_ok': True,
-                                'is_storable': True,
-                            }
-                            # Note: Portal users still need sudo for product creation
-                            new_product = request.env['product.product'].sudo().create(product_vals)
-                            product_id = new_product.id
-
-                        # Create product line
-                        line_vals = {
-                            'description': description.strip() if description else product_name.strip(),
-                            'quantity': quantity,
-                            'product_id': int(product_id),
-                        }
-
-                        # Add procurement-specific fields for purchase-type categories
-                        if category.approval_type == 'purchase':
-                            _logger.info(f"Processing purchase-type line {i}: price={price}, vendor_id={vendor_id}")
-                            if price > 0:
-                                line_vals['price_unit'] = price
-                            if vendor_id:
-                                line_vals['vendor_id'] = vendor_id
-
-                                # Also create/find supplier info for RFQ creation
-                                # The approvals_purchase addon expects seller_id to be set
-                                product_template_id = new_product.product_tmpl_id.id if not product_id else \
-                                                    request.env['product.product'].sudo().browse(int(product_id)).product_tmpl_id.id
-
-                                supplier_info = request.env['product.supplierinfo'].sudo().search([
-                                    ('partner_id', '=', vendor_id),
-                                    ('product_tmpl_id', '=', product_template_id)
-                                ], limit=1)
-
-                                if not supplier_info:
-                                    # Create supplier info for this vendor-product combination
-                                    supplier_info = request.env['product.supplierinfo'].sudo().create({
-                                        'partner_id': vendor_id,
-                                        'product_tmpl_id': product_template_id,
-                                        'min_qty': 1.0,
-                                        'price': price if price > 0 else 0.0,
-                                        'currency_id': request.env.company.currency_id.id,
-                                        'company_id': request.env.company.id,
-                                    })
-
-                                line_vals['seller_id'] = supplier_info.id
-
-                        product_lines.append((0, 0, line_vals))
+                for row in rows:
+                    # Create product line
+                    line_vals = {
+                        'description': row['description'],
+                        'quantity': row['quantity'],
+                        'product_id': row['product'].id,
+                    }
+
+                    # Add procurement-specific fields for purchase-type categories
+                    if is_purchase:
+                        if row['price'] > 0:
+                            line_vals['price_unit'] = row['price']
+                        if row['vendor_id']:
+                            # The approvals_purchase addon expects seller_id to be set
+                            line_vals['vendor_id'] = row['vendor_id']
+                            line_vals['seller_id'] = row['supplier_info'].id
+
+                    product_lines.append((0, 0, line_vals))
 
                 if product_lines:
                     vals['product_line_ids'] = product_lines
 
                     # For stock requisitions, auto-assign source location based on product availability
                     if category.name == 'Stock Requisition':
-                        source_location = self._find_best_source_location(product_lines)
+                        ranking = request.env['ir.config_parameter'].sudo().get_param(
+                            'platinum_proj.source_location_ranking', 'score')
+                        source_location = self._find_best_source_location(product_lines, ranking=ranking)
                         if source_location:
                             vals['source_location_id'] = source_location.id
 
@@ -550,29 +846,22 @@ class EmployeePortal(CustomerPortal):
             approval = request.env['approval.request'].sudo().create(vals)
 
             # Handle file attachments if any
-            if request.httprequest.files:
-                for file_key, file in request.httprequest.files.items():
-                    if file.filename:
-                        # Determine if this is a quotation based on field name or file type
-                        is_quotation = (
-                            'quotation' in file_key.lower() or
-                            'quote' in file.filename.lower() or
-                            file.filename.lower().endswith(('.pdf', '.doc', '.docx'))
-                        )
-
-                        attachment_vals = {
-                            'name': file.filename,
-                            'datas': base64.b64encode(file.read()),
-                            'res_model': 'approval.request',
-                            'res_id': approval.id,
-                            'description': 'Quotation' if is_quotation else 'Supporting Document',
-                        }
-
-                        # Add quotation-specific metadata if available
-                        if is_quotation and vals.get('partner_id'):
-                            attachment_vals['res_field'] = f'quotation_vendor_{vals["partner_id"]}'
-
-                        request.env['ir.attachment'].sudo().create(attachment_vals)
+            Attachment = request.env['ir.attachment'].sudo()
+            for file_key, file in uploads:
+                # Determine if this is a quotation based on field name or file type
+                is_quotation = (
+                    'quotation' in file_key.lower() or
+                    'quote' in file.filename.lower() or
+                    file.filename.lower().endswith(('.pdf', '.doc', '.docx'))
+                )
+
+                Attachment._create_from_stream(file.stream, {
+                    'name': file.filename,
+                    'res_model': 'approval.request',
+                    'res_id': approval.id,
+                    'description': 'Quotation' if is_quotation else 'Supporting Document',
+                    'approval_role': 'quotation' if is_quotation else 'supporting',
+                })
 
             # Submit the request (always confirm for portal submissions)
             # Portal users create requests that go directly into the approval workflow
@@ -581,15 +870,56 @@ class EmployeePortal(CustomerPortal):
             return request.redirect(f'/my/approval/{approval.id}')
 
         # GET request - show form
-        partners = request.env['res.partner'].search([]) if category.has_partner else []
-
+        # Vendors are searched remotely; only the selected one is rendered
         values = {
             'category': category,
-            'partners': partners,
+            'selected_vendor': request.env['res.partner'],
             'page_name': 'approval',
         }
         return request.render("platinum_proj.portal_approval_new", values)
 
+    def _get_upload_limits(self):
+        """Return the (per-file, per-request) upload size limits in bytes"""
+        ICP = request.env['ir.config_parameter'].sudo()
+        max_file_mb = float(ICP.get_param(
+            'platinum_proj.upload_max_file_size_mb', UPLOAD_MAX_FILE_SIZE_MB))
+        max_request_mb = float(ICP.get_param(
+            'platinum_proj.upload_max_request_size_mb', UPLOAD_MAX_REQUEST_SIZE_MB))
+        return int(max_file_mb * 1024 * 1024), int(max_request_mb * 1024 * 1024)
+
+    def _get_uploaded_files(self):
+        """Return the uploaded files of the request as ``(field name, file)``
+
+        Sizes are checked against the configured limits without reading
+        the uploads: the request's Content-Length first, then each spooled
+        upload by seeking to its end.
+
+        :raise UserError: when a file or the whole request is too large
+        """
+        max_file_size, max_request_size = self._get_upload_limits()
+        httprequest = request.httprequest
+        if httprequest.content_length and httprequest.content_length > max_request_size:
+            raise UserError(_('The uploaded files exceed the maximum of %s MB per request.')
+                            % (max_request_size // (1024 * 1024)))
+
+        uploads = []
+        total_size = 0
+        for file_key, file in httprequest.files.items(multi=True):
+            if not file.filename:
+                continue
+            file.stream.seek(0, 2)
+            size = file.stream.tell()
+            file.stream.seek(0)
+            if size > max_file_size:
+                raise UserError(_('The file %(name)s exceeds the maximum of %(size)s MB per file.',
+                                  name=file.filename, size=max_file_size // (1024 * 1024)))
+            total_size += size
+            if total_size > max_request_size:
+                raise UserError(_('The uploaded files exceed the maximum of %s MB per request.')
+                                % (max_request_size // (1024 * 1024)))
+            uploads.append((file_key, file))
+        return uploads
+
     def _document_check_access(self, model_name, document_id, access_token=None):
         """Check access rights for portal documents"""
         document = request.env[model_name].browse([document_id])
@@ -612,29 +942,9 @@ class EmployeePortal(CustomerPortal):
         if not search or len(search) < 2:
             return {'products': []}
 
-        domain = [
-            '|', '|',
-            ('name', 'ilike', search),
-            ('default_code', 'ilike', search),
-            ('barcode', 'ilike', search)
-        ]
-
         # Use sudo() until security rules take effect after module upgrade
-        products = request.env['product.product'].sudo().search(domain, limit=limit)
-
-        product_list = []
-        for product in products:
-            # Use sudo() for UOM access until security rules take effect
-            uom_name = product.sudo().uom_id.name if product.sudo().uom_id else 'Units'
-            uom_id = product.sudo().uom_id.id if product.sudo().uom_id else 1
-
-            product_list.append({
-                'id': product.id,
-                'name': product.name,
-                'default_code': product.default_code,
-                'uom_name': uom_name,
-                'uom_id': uom_id,
-            })
+        product_list = request.env['product.product'].sudo()._portal_search_ranked(
+            search, limit=min(int(limit), 50))
 
         return {'products': product_list}
 
@@ -662,25 +972,22 @@ class EmployeePortal(CustomerPortal):
         }
 
     @http.route(['/my/approval/search_vendors'], type='json', auth="user", website=True)
-    def portal_search_vendors(self, search='', limit=10, **kw):
-        """Search vendors for approval requests"""
-        if not search or len(search) < 2:
-            return {'vendors': []}
+    def portal_search_vendors(self, search='', limit=10, offset=0, **kw):
+        """Search vendors for approval requests, one page at a time
 
-        domain = [
-            ('is_company', '=', True),
-            ('supplier_rank', '>', 0),
-            '|', '|',
-            ('name', 'ilike', search),
-            ('email', 'ilike', search),
-            ('vat', 'ilike', search)
-        ]
+        :return: ``{'vendors': [...], 'has_more': bool}``
+        """
+        if not search or len(search) < 2:
+            return {'vendors': [], 'has_more': False}
 
-        # Use sudo() since portal users don't have direct partner access
-        vendors = request.env['res.partner'].sudo().search(domain, limit=limit)
+        # Use sudo() since portal users don't have direct partner access;
+        # one extra row tells whether another page exists
+        limit = min(int(limit), 50)
+        vendors = request.env['res.partner'].sudo()._portal_search_vendors_ranked(
+            search, limit=limit + 1, offset=max(int(offset), 0))
 
         vendor_list = []
-        for vendor in vendors:
+        for vendor in vendors[:limit]:
             vendor_list.append({
                 'id': vendor.id,
                 'name': vendor.name,
@@ -691,7 +998,7 @@ class EmployeePortal(CustomerPortal):
                 'country': vendor.country_id.name if vendor.country_id else '',
             })
 
-        return {'vendors': vendor_list}
+        return {'vendors': vendor_list, 'has_more': len(vendors) > limit}
 
     @http.route(['/my/approval/create_vendor'], type='json', auth="user", website=True)
     def portal_create_vendor(self, name, email='', phone='', **kw):
@@ -700,137 +1007,238 @@ class EmployeePortal(CustomerPortal):
             return {'success': False, 'message': 'Vendor name is required'}
 
         try:
-            # Check if vendor already exists
-            existing_vendor = request.env['res.partner'].sudo().search([
-                ('name', '=ilike', name.strip()),
-                ('is_company', '=', True)
-            ], limit=1)
-
-            if existing_vendor:
-                return {
-                    'success': True,
-                    'vendor': {
-                        'id': existing_vendor.id,
-                        'name': existing_vendor.name,
-                        'email': existing_vendor.email or '',
-                        'phone': existing_vendor.phone or '',
-                        'existing': True
-                    }
-                }
-
-            # Create new vendor
-            vendor_vals = {
-                'name': name.strip(),
-                'is_company': True,
-                'supplier_rank': 1,
-                'customer_rank': 0,
-            }
-
-            if email and email.strip():
-                vendor_vals['email'] = email.strip()
-            if phone and phone.strip():
-                vendor_vals['phone'] = phone.strip()
-
-            new_vendor = request.env['res.partner'].sudo().create(vendor_vals)
+            vendor, created = request.env['res.partner'].sudo()._find_or_create_vendor(
+                name, email=(email or '').strip(), phone=(phone or '').strip())
 
             return {
                 'success': True,
                 'vendor': {
-                    'id': new_vendor.id,
-                    'name': new_vendor.name,
-                    'email': new_vendor.email or '',
-                    'phone': new_vendor.phone or '',
-                    'existing': False
+                    'id': vendor.id,
+                    'name': vendor.name,
+                    'email': vendor.email or '',
+                    'phone': vendor.phone or '',
+                    'existing': not created
                 }
             }
 
+        except OperationalError:
+            # Let concurrency errors reach the server so it retries the request
+            raise
         except Exception as e:
             _logger.error(f"Error creating vendor: {e}")
             return {'success': False, 'message': 'Error creating vendor. Please try again.'}
 
-    @http.route(['/my/approval/check_stock_availability'], type='json', auth="user", website=True)
-    def portal_check_stock_availability(self, product_id, quantity=1, **kw):
-        """Check stock availability for a product across all locations"""
-        if not product_id:
-            return {'available': False, 'locations': []}
-
-        product = request.env['product.product'].sudo().browse(int(product_id))
-        if not product.exists():
-            return {'available': False, 'locations': []}
-
-        # Get all internal locations
-        locations = request.env['stock.location'].sudo().search([
-            ('usage', '=', 'internal'),
-            ('company_id', '=', request.env.company.id)
+    def _get_budget_snapshot(self):
+        """Return the category configuration and budget snapshot of the current company
+
+        The snapshot is built from one category search and one ledger read,
+        and kept per worker for a short, configurable TTL
+        (``platinum_proj.budget_snapshot_ttl``) so per-keystroke budget
+        validation does not hit the database each time.
+        """
+        company = request.env.company
+        key = (request.env.cr.dbname, company.id)
+        now = time.monotonic()
+        cached = _budget_snapshots.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+        snapshot = self._build_budget_snapshot(company)
+        ttl = int(request.env['ir.config_parameter'].sudo().get_param(
+            'platinum_proj.budget_snapshot_ttl', BUDGET_SNAPSHOT_TTL))
+        _budget_snapshots[key] = (now + ttl, snapshot)
+        return snapshot
+
+    def _build_budget_snapshot(self, company):
+        """Read category configuration and this month's budget ledger for a company"""
+        categories = request.env['approval.category'].sudo().search([
+            ('active', '=', True),
+            ('company_id', 'in', [company.id, False])
         ])
 
-        location_availability = []
-        total_available = 0
-
-        for location in locations:
-            available_qty = request.env['stock.quant'].sudo()._get_available_quantity(
-                product,
-                location,
-                strict=True
-            )
+        Ledger = request.env['approval.budget.ledger'].sudo()
+        accounts = categories.budget_line_id
+        ledgers = Ledger.search([
+            ('analytic_account_id', 'in', accounts.ids),
+            ('company_id', '=', company.id),
+            ('month', '=', Ledger._month_of()),
+        ])
+        ledger_by_account = {ledger.analytic_account_id.id: ledger for ledger in ledgers}
+
+        budgets = {}
+        for account in accounts:
+            ledger = ledger_by_account.get(account.id, Ledger)
+            total = account.budget or 0
+            budgets[account.id] = {
+                'total_budget': total,
+                'spent_amount': ledger.approved_amount,
+                'committed_amount': ledger.committed_amount,
+                'reserved_amount': ledger.reserved_amount,
+                'available_budget': total - ledger.approved_amount - ledger.reserved_amount,
+            }
 
-            if available_qty > 0:
-                location_availability.append({
-                    'location_id': location.id,
-                    'location_name': location.complete_name,
-                    'available_qty': available_qty,
-                    'sufficient': available_qty >= float(quantity)
-                })
-                total_available += available_qty
+        config_fields = ['has_date', 'has_period', 'has_amount', 'has_quantity',
+                         'has_location', 'has_reference', 'has_partner']
+        category_snapshots = {}
+        for category in categories:
+            config = {fname: category[fname] != 'no' for fname in config_fields}
+            # Purchase requests always show the (default) vendor field
+            config['has_partner'] = config['has_partner'] or category.approval_type == 'purchase'
+            category_snapshots[category.id] = {
+                'config': config,
+                'budget_line_id': category.budget_line_id.id,
+            }
 
         return {
-            'available': total_available >= float(quantity),
-            'total_available': total_available,
-            'locations': location_availability,
-            'product_name': product.name
+            'categories': category_snapshots,
+            'budgets': budgets,
         }
 
-    def _find_best_source_location(self, product_lines):
-        """Find the best source location based on product availability"""
-        # Get all internal locations
-        locations = request.env['stock.location'].sudo().search([
-            ('usage', '=', 'internal'),
-            ('company_id', '=', request.env.company.id)
-        ])
-
-        location_scores = {}
+    def _etag_json_response(self, payload, etag=None):
+        """Tag a JSON payload with an ETag, short-circuiting unchanged results
+
+        The client may send the ETag of its previous result as ``etag`` (or
+        in ``If-None-Match``); when it still matches, only
+        ``{'not_modified': True}`` is sent back.
+        """
+        digest = hashlib.sha1(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+        request.future_response.headers['ETag'] = f'"{digest}"'
+        client_etag = etag or request.httprequest.headers.get('If-None-Match', '').strip('"')
+        if client_etag == digest:
+            return {'not_modified': True, 'etag': digest}
+        return dict(payload, etag=digest)
+
+    @http.route(['/my/approval/category_info'], type='json', auth="user", website=True)
+    def portal_category_info(self, category_id, etag=None, **kw):
+        """Category configuration and current month budget status"""
+        snapshot = self._get_budget_snapshot()
+        category = snapshot['categories'].get(int(category_id))
+        if not category:
+            return {'category_config': {}, 'budget_info': False}
+
+        return self._etag_json_response({
+            'category_config': category['config'],
+            'budget_info': snapshot['budgets'].get(category['budget_line_id'], False),
+        }, etag)
+
+    @http.route(['/my/approval/check_budget'], type='json', auth="user", website=True)
+    def portal_check_budget(self, amount, category_id, etag=None, **kw):
+        """Check whether an amount fits in the remaining budget of a category"""
+        snapshot = self._get_budget_snapshot()
+        category = snapshot['categories'].get(int(category_id))
+        budget = category and snapshot['budgets'].get(category['budget_line_id'])
+        if not budget:
+            # No budget tracking for this category
+            return self._etag_json_response({'available': True, 'budget_info': False}, etag)
+
+        return self._etag_json_response({
+            'available': float(amount or 0) <= budget['available_budget'],
+            'budget_info': budget,
+        }, etag)
 
-        for location in locations:
-            score = 0
-            total_products = 0
+    @http.route(['/my/approval/check_stock_availability'], type='json', auth="user", website=True)
+    def portal_check_stock_availability(self, product_id, quantity=1, **kw):
+        """Check stock availability for a product across all locations"""
+        if not product_id:
+            return {'available': False, 'locations': []}
 
-            # Check availability of each product in this location
-            for line_data in product_lines:
-                # Extract product_id from the line data tuple (0, 0, {dict})
-                if len(line_data) >= 3 and isinstance(line_data[2], dict):
-                    product_id = line_data[2].get('product_id')
-                    quantity = line_data[2].get('quantity', 1)
+        result = self.portal_check_stock_availability_batch(
+            [{'product_id': product_id, 'quantity': quantity}]
+        )
+        product_result = result['products'].get(int(product_id))
+        if not product_result:
+            return {'available': False, 'locations': []}
+        return product_result
+
+    @http.route(['/my/approval/check_stock_availability_batch'], type='json', auth="user", website=True)
+    def portal_check_stock_availability_batch(self, lines=None, **kw):
+        """Check stock availability for all form lines at once
+
+        Quantities requested for the same product on several lines are
+        added up. Availability across every internal location of the
+        company is read with a single grouped ``stock.quant`` query.
+
+        :param lines: list of dicts with ``product_id`` and ``quantity``
+        :return: dict with the overall ``available`` flag, the ``locations``
+                 holding stock for at least one product, and per product id
+                 the same payload as ``/my/approval/check_stock_availability``
+        """
+        requested = {}
+        for line in lines or []:
+            try:
+                product_id = int(line.get('product_id') or 0)
+                quantity = float(line.get('quantity') or 1)
+            except (TypeError, ValueError):
+                continue
+            if product_id:
+                requested[product_id] = requested.get(product_id, 0.0) + quantity
+
+        products = request.env['product.product'].sudo().browse(list(requested)).exists()
+        if not products:
+            return {'available': False, 'locations': [], 'products': {}}
+
+        locations = request.env['stock.location']._get_requisition_source_locations()
+        availability = request.env['stock.quant']._get_available_quantity_map(products, locations)
+
+        product_results = {}
+        stocked_location_ids = set()
+        for product in products:
+            quantity = requested[product.id]
+            location_availability = []
+            total_available = 0
+            for location in locations:
+                available_qty = availability.get((product.id, location.id), 0.0)
+                if available_qty > 0:
+                    location_availability.append({
+                        'location_id': location.id,
+                        'location_name': location.complete_name,
+                        'available_qty': available_qty,
+                        'sufficient': available_qty >= quantity
+                    })
+                    total_available += available_qty
+                    stocked_location_ids.add(location.id)
+
+            product_results[product.id] = {
+                'available': total_available >= quantity,
+                'requested_qty': quantity,
+                'total_available': total_available,
+                'locations': location_availability,
+                'product_name': product.name
+            }
 
-                    if product_id:
-                        total_products += 1
-                        available_qty = request.env['stock.quant'].sudo()._get_available_quantity(
-                            request.env['product.product'].browse(product_id),
-                            location,
-                            strict=True
-                        )
+        return {
+            'available': all(res['available'] for res in product_results.values()),
+            'locations': [
+                {'location_id': location.id, 'location_name': location.complete_name}
+                for location in locations if location.id in stocked_location_ids
+            ],
+            'products': product_results,
+        }
 
-                        if available_qty >= quantity:
-                            score += 1  # Full availability
-                        elif available_qty > 0:
-                            score += 0.5  # Partial availability
+    def _find_best_source_location(self, product_lines, ranking='score'):
+        """Find the best source location based on product availability
+
+        :param product_lines: list of (0, 0, vals) product line commands
+        :param ranking: ``score`` (best average availability) or
+                        ``coverage`` (full coverage first, then fewest
+                        split picks)
+        """
+        product_quantities = []
+        for line_data in product_lines:
+            # Extract product_id from the line data tuple (0, 0, {dict})
+            if len(line_data) >= 3 and isinstance(line_data[2], dict):
+                product_id = line_data[2].get('product_id')
+                if product_id:
+                    product_quantities.append((product_id, line_data[2].get('quantity', 1)))
 
-            if total_products > 0:
-                location_scores[location] = score / total_products
+        ranked = request.env['stock.location']._rank_source_locations(
+            product_quantities, ranking=ranking
+        )
 
         # Return location with highest availability score
-        if location_scores:
-            best_location = max(location_scores, key=location_scores.get)
-            return best_location if location_scores[best_location] > 0 else None
+        if ranked:
+            best = ranked[0]
+            return best['location'] if best['score'] > 0 else None
 
         # Fallback to main stock location if no products or no availability found
-        return request.env.ref('stock.stock_location_stock', False)
\ No newline at end of file
+        return request.env.ref('stock.stock_location_stock', False)
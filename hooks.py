@@ -0,0 +1,7 @@
+# -*- coding: utf-8 -*-
+
+
+def post_init_hook(env):
+    """Build the budget ledger and attachment roles of existing requests"""
+    env['approval.budget.ledger'].action_rebuild()
+    env['ir.attachment']._backfill_approval_roles()
@@ -0,0 +1,23 @@
+# -*- coding: utf-8 -*-
+
+from odoo import SUPERUSER_ID, api
+
+
+def migrate(cr, version):
+    """Key existing requests on their submission date and build the ledger once
+
+    The ledger is built here for existing requests rather than on every
+    module update; its totals are then kept up to date incrementally.
+    Existing request attachments get their role once as well.
+    """
+    if not version:
+        return
+    cr.execute("""
+        UPDATE approval_request
+           SET budget_date = date_confirmed::date
+         WHERE budget_date IS NULL
+           AND date_confirmed IS NOT NULL
+    """)
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['approval.budget.ledger'].action_rebuild()
+    env['ir.attachment']._backfill_approval_roles()
@@ -1,4 +1,16 @@
 # -*- coding: utf-8 -*-
 
+from . import approval_budget_ledger
+from . import approval_budget_reservation
+from . import approval_category
 from . import approval_request
-from . import hr_employee
\ No newline at end of file
+from . import approval_request_job
+from . import hr_employee
+from . import ir_attachment
+from . import product_product
+from . import purchase_order
+from . import res_partner
+from . import stock_location
+from . import stock_move
+from . import stock_picking
+from . import stock_quant
@@ -0,0 +1,194 @@
+# -*- coding: utf-8 -*-
+
+from collections import defaultdict
+
+from odoo import api, fields, models, _
+from odoo.tools import SQL
+
+# Totals kept up to date by ``_apply_deltas``
+LEDGER_AMOUNT_FIELDS = ['committed_amount', 'approved_amount', 'reserved_amount']
+
+
+class ApprovalBudgetLedger(models.Model):
+    _name = 'approval.budget.ledger'
+    _description = 'Approval Budget Ledger'
+    _order = 'month desc, analytic_account_id'
+    _rec_name = 'analytic_account_id'
+
+    analytic_account_id = fields.Many2one(
+        'account.analytic.account',
+        string='Budget Category',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    company_id = fields.Many2one(
+        'res.company',
+        string='Company',
+        required=True,
+        ondelete='cascade'
+    )
+    month = fields.Date(
+        string='Month',
+        required=True,
+        help='First day of the month covered by this ledger row'
+    )
+    request_ids = fields.One2many(
+        'approval.request',
+        'budget_ledger_id',
+        string='Approval Requests'
+    )
+    committed_amount = fields.Float(
+        string='Committed',
+        readonly=True,
+        help='Total amount of submitted requests awaiting approval'
+    )
+    approved_amount = fields.Float(
+        string='Approved',
+        readonly=True,
+        help='Total amount of requests approved in the month'
+    )
+    reservation_ids = fields.One2many(
+        'approval.budget.reservation',
+        'ledger_id',
+        string='Reservations'
+    )
+    reserved_amount = fields.Float(
+        string='Reserved',
+        readonly=True,
+        help='Budget reserved by submitted requests awaiting approval'
+    )
+
+    _sql_constraints = [
+        ('account_company_month_uniq', 'unique(analytic_account_id, company_id, month)',
+         'There can only be one budget ledger row per budget category, company and month.'),
+    ]
+
+    @api.model
+    def _apply_deltas(self, deltas):
+        """Add amounts to ledger totals in place
+
+        Only the rows and totals that change are updated, in id order to
+        avoid deadlocks, without re-aggregating their requests.
+
+        :param deltas: dict {(ledger id, amount field): amount to add}
+        """
+        amounts_by_ledger = defaultdict(dict)
+        for (ledger_id, fname), amount in deltas.items():
+            if ledger_id and amount:
+                amounts_by_ledger[ledger_id][fname] = amount
+        if not amounts_by_ledger:
+            return
+
+        self.flush_model(LEDGER_AMOUNT_FIELDS)
+        for ledger_id, amounts in sorted(amounts_by_ledger.items()):
+            self.env.cr.execute(SQL(
+                "UPDATE approval_budget_ledger SET %s WHERE id = %s",
+                SQL(", ").join(
+                    SQL("%s = %s + %s", SQL.identifier(fname), SQL.identifier(fname), amount)
+                    for fname, amount in amounts.items()
+                ),
+                ledger_id,
+            ))
+        self.browse(list(amounts_by_ledger)).invalidate_recordset(LEDGER_AMOUNT_FIELDS)
+
+    def _lock_for_reservation(self):
+        """Lock these ledger rows until the end of the transaction
+
+        Only the budget rows are locked, in id order to avoid deadlocks.
+        Cached totals are dropped so they are read again under the lock.
+        """
+        if not self:
+            return
+        self.flush_recordset()
+        self.env.cr.execute("""
+            SELECT id FROM approval_budget_ledger
+            WHERE id IN %s
+            ORDER BY id
+            FOR NO KEY UPDATE
+        """, [tuple(self.ids)])
+        self.invalidate_recordset(LEDGER_AMOUNT_FIELDS)
+
+    @api.model
+    def _month_of(self, value=None):
+        """Return the first day of the month of a date/datetime (default: today)"""
+        value = fields.Date.to_date(value or fields.Date.today())
+        return value.replace(day=1)
+
+    @api.model
+    def _get_ledger(self, analytic_account, company, month, create=False):
+        """Return the ledger row for (account, company, month)
+
+        :param create: create the row when it does not exist yet
+        """
+        Ledger = self.sudo()
+        domain = [
+            ('analytic_account_id', '=', analytic_account.id),
+            ('company_id', '=', company.id),
+            ('month', '=', month),
+        ]
+        ledger = Ledger.search(domain, limit=1)
+        if ledger or not create:
+            return ledger
+
+        # Insert-or-ignore: a concurrent transaction creating the same row
+        # makes this one wait, then fail with a serialization error that
+        # the server retries, rather than a unique violation
+        self.env.cr.execute("""
+            INSERT INTO approval_budget_ledger (
+                analytic_account_id, company_id, month,
+                committed_amount, approved_amount, reserved_amount,
+                create_uid, create_date, write_uid, write_date
+            )
+            VALUES (%s, %s, %s, 0, 0, 0, %s, now() at time zone 'UTC', %s, now() at time zone 'UTC')
+            ON CONFLICT (analytic_account_id, company_id, month) DO NOTHING
+            RETURNING id
+        """, (analytic_account.id, company.id, month, self.env.uid, self.env.uid))
+        row = self.env.cr.fetchone()
+        if row:
+            return Ledger.browse(row[0])
+        return Ledger.search(domain, limit=1)
+
+    @api.model
+    def action_rebuild(self):
+        """Reconcile the ledger against approval.request
+
+        Every request with a budget category is re-attached to the row of
+        its (account, company, budget month), all row totals are
+        recomputed from scratch and rows left without requests are removed.
+        """
+        Request = self.env['approval.request'].sudo().with_context(
+            active_test=False, budget_ledger_tracked=True)
+        requests = Request.search([])
+        requests._assign_budget_ledger()
+
+        totals = defaultdict(float)
+        for ledger, status, amount in Request._read_group(
+                [('budget_ledger_id', '!=', False), ('request_status', 'in', ('pending', 'approved'))],
+                groupby=['budget_ledger_id', 'request_status'],
+                aggregates=['amount:sum']):
+            totals[(ledger.id, 'committed_amount' if status == 'pending' else 'approved_amount')] = amount
+        for ledger, amount in self.env['approval.budget.reservation'].sudo()._read_group(
+                [('state', '=', 'reserved')], groupby=['ledger_id'], aggregates=['amount:sum']):
+            totals[(ledger.id, 'reserved_amount')] = amount
+
+        ledgers = self.sudo().search([])
+        for ledger in ledgers:
+            ledger.write({fname: totals[(ledger.id, fname)] for fname in LEDGER_AMOUNT_FIELDS})
+
+        used_ledgers = self.browse([
+            ledger.id for [ledger] in Request._read_group(
+                [('budget_ledger_id', '!=', False)], groupby=['budget_ledger_id'])
+        ])
+        (ledgers - used_ledgers).unlink()
+
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Budget Ledger'),
+                'message': _('Budget ledger rebuilt from %s approval requests.') % len(requests),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, fields, models
+
+
+class ApprovalBudgetReservation(models.Model):
+    _name = 'approval.budget.reservation'
+    _description = 'Approval Budget Reservation'
+    _order = 'id desc'
+    _rec_name = 'request_id'
+
+    request_id = fields.Many2one(
+        'approval.request',
+        string='Approval Request',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    ledger_id = fields.Many2one(
+        'approval.budget.ledger',
+        string='Budget Ledger',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    amount = fields.Float(
+        string='Amount',
+        help='Amount reserved when the request was submitted'
+    )
+    state = fields.Selection([
+        ('reserved', 'Reserved'),
+        ('consumed', 'Consumed'),
+        ('released', 'Released'),
+    ], string='Status', compute='_compute_state', store=True)
+
+    _sql_constraints = [
+        ('request_uniq', 'unique(request_id)',
+         'An approval request can only hold one budget reservation.'),
+    ]
+
+    @api.depends('request_id.request_status')
+    def _compute_state(self):
+        """Reserved while pending, consumed once approved, released otherwise"""
+        for reservation in self:
+            status = reservation.request_id.request_status
+            if status == 'pending':
+                reservation.state = 'reserved'
+            elif status == 'approved':
+                reservation.state = 'consumed'
+            else:
+                reservation.state = 'released'
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class ApprovalCategory(models.Model):
+    _inherit = 'approval.category'
+
+    budget_line_id = fields.Many2one(
+        'account.analytic.account',
+        string='Budget Category',
+        help='Analytic account used for budget tracking of requests in this category'
+    )
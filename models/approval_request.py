@@ -1,7 +1,20 @@
 # -*- coding: utf-8 -*-
 
+from collections import defaultdict
+from contextlib import contextmanager
+
 from odoo import api, fields, models, _
 from odoo.exceptions import UserError
+from odoo.tools import SQL, str2bool
+from odoo.tools.sql import create_index
+
+# Text search configuration of the request search vector
+FULLTEXT_CONFIG = 'english'
+# Single tokens shorter than this are matched as partial words instead
+FULLTEXT_MIN_TOKEN_LENGTH = 4
+
+# Request fields whose change moves amounts between budget ledger rows
+BUDGET_LEDGER_FIELDS = {'amount', 'request_status', 'budget_ledger_id', 'budget_line_id', 'company_id', 'budget_date'}
 
 
 class ApprovalProductLine(models.Model):
@@ -38,6 +51,19 @@ class ApprovalProductLine(models.Model):
                 self.seller_id = False
 
 
+class ApprovalApprover(models.Model):
+    _inherit = 'approval.approver'
+
+    def write(self, vals):
+        if 'status' not in vals:
+            return super().write(vals)
+        # Request statuses follow their approvers
+        with self.request_id._track_budget_ledger():
+            res = super().write(vals)
+        self.request_id._bump_status_version()
+        return res
+
+
 class ApprovalRequest(models.Model):
     _inherit = 'approval.request'
 
@@ -48,9 +74,11 @@ class ApprovalRequest(models.Model):
     dest_location_id = fields.Many2one('stock.location', string='Destination Location',
                                       domain="[('usage', '=', 'internal'), ('company_id', 'in', [company_id, False])]",
                                       help="Location where products will be delivered")
-    stock_picking_id = fields.Many2one('stock.picking', string='Internal Transfer', readonly=True,
+    stock_picking_id = fields.Many2one('stock.picking', string='Internal Transfer', readonly=True, index='btree_not_null',
                                       help="Internal transfer created from this request")
     picking_state = fields.Selection(related='stock_picking_id.state', string='Transfer Status', readonly=True)
+    stock_move_ids = fields.One2many('stock.move', 'approval_request_id', string='Stock Moves', readonly=True,
+                                     help="Moves of the internal transfer fulfilling this request")
     stock_availability_checked = fields.Boolean('Stock Checked', default=False,
                                                help="Whether stock availability has been verified")
 
@@ -84,6 +112,28 @@ class ApprovalRequest(models.Model):
         help='Analytic account used for budget tracking'
     )
 
+    budget_ledger_id = fields.Many2one(
+        'approval.budget.ledger',
+        string='Budget Ledger',
+        readonly=True,
+        index=True,
+        copy=False,
+        help='Monthly budget ledger row this request is accounted in'
+    )
+
+    budget_date = fields.Date(
+        string='Budget Date',
+        readonly=True,
+        copy=False,
+        help='Date the request is accounted at: its submission, then its approval'
+    )
+
+    budget_reservation_ids = fields.One2many(
+        'approval.budget.reservation',
+        'request_id',
+        string='Budget Reservations'
+    )
+
     # Purchase order integration
     purchase_order_id = fields.Many2one(
         'purchase.order',
@@ -92,6 +142,14 @@ class ApprovalRequest(models.Model):
         help='Purchase order created from this approval request'
     )
 
+    # Bumped from a sequence whenever the status or an approver changes,
+    # so portal pages can poll for changes cheaply
+    status_version = fields.Integer(
+        string='Status Version',
+        copy=False,
+        readonly=True
+    )
+
     # Portal-specific fields
     portal_submission = fields.Boolean(
         string='Submitted via Portal',
@@ -108,149 +166,498 @@ class ApprovalRequest(models.Model):
         readonly=True
     )
 
+    def init(self):
+        super().init()
+        self.env.cr.execute("CREATE SEQUENCE IF NOT EXISTS approval_request_status_version_seq")
+
+        # Search vector over name, reference and reason (tags stripped),
+        # kept up to date by PostgreSQL itself
+        self.env.cr.execute(SQL("""
+            ALTER TABLE approval_request
+            ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector(%(config)s::regconfig, coalesce(name, '')), 'A') ||
+                setweight(to_tsvector(%(config)s::regconfig, coalesce(reference, '')), 'A') ||
+                setweight(to_tsvector(%(config)s::regconfig,
+                          regexp_replace(coalesce(reason, ''), '<[^>]*>', ' ', 'g')), 'B')
+            ) STORED
+        """, config=FULLTEXT_CONFIG))
+        create_index(self.env.cr, 'approval_request_search_vector_idx', self._table,
+                     ['search_vector'], method='gin')
+        # Per-owner status counters of the portal home
+        create_index(self.env.cr, 'approval_request_owner_status_idx', self._table,
+                     ['request_owner_id', 'request_status'])
+        if self.env.registry.has_trigram:
+            for column in ('name', 'reference'):
+                create_index(self.env.cr, f'approval_request_{column}_trgm_idx', self._table,
+                             [f'{column} gin_trgm_ops'], method='gin')
+
+    @api.model
+    def _use_fulltext_search(self, search):
+        """Whether ``search`` makes a useful full-text query
+
+        Short single tokens (likely partial words) and queries made only
+        of stop words fall back to substring matching.
+        """
+        words = search.split()
+        if len(words) == 1 and len(words[0]) < FULLTEXT_MIN_TOKEN_LENGTH:
+            return False
+        self.env.cr.execute(
+            "SELECT numnode(websearch_to_tsquery(%s::regconfig, %s))", [FULLTEXT_CONFIG, search])
+        return bool(self.env.cr.fetchone()[0])
+
+    @api.model
+    def _get_portal_search_domain(self, search):
+        """Domain matching ``search`` against name, reference and reason
+
+        Uses the GIN-indexed search vector with ``websearch_to_tsquery``
+        (quoted phrases, ``or``, ``-word``), or the trigram-indexed name
+        and reference for short partial tokens.
+        """
+        search = search.strip()
+        if not self._use_fulltext_search(search):
+            return ['|', ('name', 'ilike', search), ('reference', 'ilike', search)]
+
+        query = self.sudo()._search([])
+        query.add_where(SQL(
+            "%s @@ websearch_to_tsquery(%s::regconfig, %s)",
+            SQL.identifier(self._table, 'search_vector'), FULLTEXT_CONFIG, search,
+        ))
+        return [('id', 'in', query)]
+
+    @api.model
+    def _portal_search_ranked(self, domain, search, limit=None, offset=0):
+        """Search ``domain`` ordered by relevance to ``search``
+
+        Full-text matches are ranked with ``ts_rank`` (name and reference
+        weigh more than the reason), partial matches by trigram similarity.
+        """
+        search = search.strip()
+        query = self._search(domain, offset=offset, limit=limit)
+        table_id = SQL.identifier(self._table, 'id')
+        if self._use_fulltext_search(search):
+            query.order = SQL(
+                "ts_rank(%s, websearch_to_tsquery(%s::regconfig, %s)) DESC, %s DESC",
+                SQL.identifier(self._table, 'search_vector'), FULLTEXT_CONFIG, search, table_id,
+            )
+        elif self.env.registry.has_trigram:
+            query.order = SQL(
+                "similarity(%s, %s) DESC, %s DESC",
+                SQL.identifier(self._table, 'name'), search, table_id,
+            )
+        return self.browse(query)
+
+    def _bump_status_version(self):
+        """Stamp these requests after a status change and push it to the owners
+
+        Called once the change is written; the status is flushed first so
+        the version and the notification carry what is stored. Values come
+        from one sequence, so a version never repeats and a client only has
+        to compare it with the one it last saw. Bus notifications are only
+        delivered if the transaction commits.
+        """
+        requests = self.sudo().filtered('id')
+        if not requests:
+            return
+        requests.flush_recordset(['request_status'])
+        self.env.cr.execute("""
+            UPDATE approval_request
+               SET status_version = nextval('approval_request_status_version_seq')
+             WHERE id IN %s
+        """, [tuple(requests.ids)])
+        requests.invalidate_recordset(['status_version'])
+
+        if not self.env.registry.ready:
+            # Module install/upgrade: nobody is watching
+            return
+        for partner, owner_requests in requests.grouped(lambda r: r.request_owner_id.partner_id).items():
+            if partner:
+                partner._bus_send('platinum_proj.approval_status', {
+                    'requests': owner_requests._get_portal_status_values(),
+                })
+
+    def _get_portal_status_values(self):
+        """Status of these requests as sent to the portal, by poll or bus"""
+        return [{
+            'id': request.id,
+            'version': request.status_version,
+            'status': request.request_status,
+            'approvers': [{
+                'name': approver.user_id.name,
+                'status': approver.status,
+            } for approver in request.approver_ids],
+        } for request in self]
+
     @api.depends('request_owner_id')
     def _compute_employee_id(self):
         """Compute employee based on request owner"""
+        # Direct user_id link first (internal users), then email matching
+        # (portal users); all owners are resolved at once
+        employee_by_user = self.env['hr.employee']._get_employee_ids_for_users(self.request_owner_id)
+
         for request in self:
-            if request.request_owner_id:
-                # First try direct user_id link (for internal users)
-                employee = self.env['hr.employee'].search([
-                    ('user_id', '=', request.request_owner_id.id)
-                ], limit=1)
-
-                # If not found, try email matching (for portal users)
-                if not employee and request.request_owner_id.email:
-                    employee = self.env['hr.employee'].search([
-                        ('work_email', '=', request.request_owner_id.email)
-                    ], limit=1)
-
-                request.employee_id = employee.id if employee else False
-            else:
-                request.employee_id = False
+            request.employee_id = employee_by_user.get(request.request_owner_id.id, False)
 
     @api.model_create_multi
     def create(self, vals_list):
         """Override create to handle portal submissions"""
+        owner_ids = {
+            vals['request_owner_id'] for vals in vals_list
+            if not vals.get('employee_id') and vals.get('request_owner_id')
+        }
+        # Direct user links only; requests left without employee get the
+        # email match from the employee_id compute
+        employee_by_user = self.env['hr.employee']._get_employee_ids_for_users(
+            self.env['res.users'].browse(list(owner_ids)), match_email=False
+        )
+
         for vals in vals_list:
             # Check if this is a portal submission
             if self.env.context.get('portal_submission'):
                 vals['portal_submission'] = True
 
+            # Default budget category from the approval category
+            if not vals.get('budget_line_id') and vals.get('category_id'):
+                category = self.env['approval.category'].browse(vals['category_id'])
+                if category.budget_line_id:
+                    vals['budget_line_id'] = category.budget_line_id.id
+
             # Auto-assign employee if not set
             if not vals.get('employee_id') and vals.get('request_owner_id'):
-                employee = self.env['hr.employee'].search([
-                    ('user_id', '=', vals['request_owner_id'])
-                ], limit=1)
-                if employee:
-                    vals['employee_id'] = employee.id
+                employee_id = employee_by_user.get(vals['request_owner_id'])
+                if employee_id:
+                    vals['employee_id'] = employee_id
+
+        requests = super().create(vals_list)
+        with requests._track_budget_ledger() as tracked:
+            tracked._assign_budget_ledger()
+        return requests
+
+    @api.model
+    def _backfill_employee_ids(self, batch_size=1000):
+        """Recompute employee_id and manager_employee_id of existing requests
+
+        Requests are processed in id-ordered chunks; each chunk is
+        resolved with the batched owner lookup, flushed, then evicted from
+        the cache so memory stays bounded whatever the table size.
+
+        :return: number of requests processed
+        """
+        Request = self.sudo().with_context(active_test=False)
+        fields_to_compute = [self._fields['employee_id'], self._fields['manager_employee_id']]
+        last_id = 0
+        processed = 0
+        while True:
+            requests = Request.search([('id', '>', last_id)], order='id', limit=batch_size)
+            if not requests:
+                break
+            for field in fields_to_compute:
+                self.env.add_to_compute(field, requests)
+            requests.flush_recordset(['employee_id', 'manager_employee_id'])
+            last_id = requests[-1].id
+            processed += len(requests)
+            self.env.invalidate_all()
+        return processed
+
+    def write(self, vals):
+        if not BUDGET_LEDGER_FIELDS & vals.keys():
+            return super().write(vals)
+
+        with self._track_budget_ledger() as tracked:
+            res = super(ApprovalRequest, tracked).write(vals)
+            if {'budget_line_id', 'company_id', 'budget_date'} & vals.keys():
+                tracked._assign_budget_ledger()
+        if {'budget_line_id', 'company_id', 'amount'} & vals.keys():
+            # Move or resize the reservations of pending requests
+            self.filtered(lambda r: r.request_status == 'pending')._reserve_budget()
+        if 'request_status' in vals:
+            self._bump_status_version()
+        return res
+
+    def unlink(self):
+        with self._track_budget_ledger(deleted=True) as tracked:
+            res = super(ApprovalRequest, tracked).unlink()
+        return res
 
-        return super().create(vals_list)
+    @contextmanager
+    def _track_budget_ledger(self, deleted=False):
+        """Apply to the budget ledger what the block changes on these requests
+
+        The amounts these requests contribute to ledger rows are taken
+        before and after the block, and only the difference is added to
+        the rows, in place. Tracking nested in a tracked block (through the
+        yielded records' context) is left to the outermost one.
+
+        :param deleted: the block deletes the requests
+        """
+        if self.env.context.get('budget_ledger_tracked'):
+            yield self
+            return
+        before = self._get_budget_contributions()
+        yield self.with_context(budget_ledger_tracked=True)
+        after = {} if deleted else self._get_budget_contributions()
+        deltas = {
+            key: after.get(key, 0.0) - before.get(key, 0.0)
+            for key in before.keys() | after.keys()
+        }
+        self.env['approval.budget.ledger']._apply_deltas(deltas)
+
+    def _get_budget_contributions(self):
+        """Return the amounts these requests add to budget ledger rows
+
+        Pending requests are committed on their row and hold their
+        reservations; approved requests are approved on their row.
+
+        :return: dict {(ledger id, amount field): amount}
+        """
+        contributions = defaultdict(float)
+        for request in self.sudo().filtered('id'):
+            status = request.request_status
+            if status not in ('pending', 'approved'):
+                continue
+            if request.budget_ledger_id:
+                fname = 'committed_amount' if status == 'pending' else 'approved_amount'
+                contributions[(request.budget_ledger_id.id, fname)] += request.amount
+            if status == 'pending':
+                for reservation in request.budget_reservation_ids:
+                    contributions[(reservation.ledger_id.id, 'reserved_amount')] += reservation.amount
+        return contributions
+
+    @api.model
+    def _get_portal_request_count(self, user):
+        """Return the number of requests owned by a user
+
+        Served by the owner/status index.
+        """
+        return self.sudo().search_count([('request_owner_id', '=', user.id)])
+
+    def _assign_budget_ledger(self):
+        """Attach requests to the ledger row of their budget category,
+        company and budget month
+
+        The budget date is set on submission and again on approval, so an
+        approved amount counts in the month it was approved, which is the
+        month budget checks read.
+        """
+        Ledger = self.env['approval.budget.ledger']
+        ledgers = {}
+        for request in self.sudo():
+            if request.budget_line_id:
+                key = (
+                    request.budget_line_id,
+                    request.company_id,
+                    Ledger._month_of(request.budget_date or request.create_date),
+                )
+                if key not in ledgers:
+                    ledgers[key] = Ledger._get_ledger(*key, create=True)
+                ledger = ledgers[key]
+            else:
+                ledger = Ledger
+            if request.budget_ledger_id != ledger:
+                request.budget_ledger_id = ledger
 
     def action_approve(self):
         """Override to handle purchase order and stock picking creation"""
         res = super().action_approve()
 
-        for request in self:
-            if request.request_status == 'approved':
-                # Handle purchase-type approvals (RFQ creation)
-                if (request.category_id.approval_type == 'purchase' and
-                    request.partner_id):
-
-                    # Check if we have the approvals_purchase addon functionality
-                    if (hasattr(request, 'action_create_purchase_orders') and
-                        request.product_line_ids):
-                        # Use the standard approvals_purchase flow if available
-                        try:
-                            request.action_create_purchase_orders()
-                        except Exception:
-                            # Fallback to our custom method if there's an issue
-                            request._create_purchase_order()
-                    else:
-                        # Use our custom method for non-purchase type categories
-                        request._create_purchase_order()
-
-                # Handle stock requisition approvals
-                elif (request.category_id.name == 'Stock Requisition' and
-                      request.source_location_id and request.dest_location_id and
-                      request.product_line_ids and not request.stock_picking_id):
-                    request._create_stock_transfer()
+        approved = self.filtered(lambda r: r.request_status == 'approved')
+        # Approved amounts count in the month of approval
+        approved.budget_date = fields.Date.context_today(self)
+        # Handle purchase-type approvals (RFQ creation)
+        purchase_requests = approved.filtered(
+            lambda r: r.category_id.approval_type == 'purchase' and r.partner_id
+        )
+        # Handle stock requisition approvals
+        stock_requests = (approved - purchase_requests).filtered(
+            lambda r: r.category_id.name == 'Stock Requisition' and
+            r.source_location_id and r.dest_location_id and
+            r.product_line_ids and not r.stock_picking_id
+        )
+
+        if self._use_async_side_effects():
+            # Leave the heavy side effects to the job queue worker
+            Job = self.env['approval.request.job']
+            Job._enqueue(purchase_requests, 'purchase_order')
+            Job._enqueue(stock_requests, 'stock_transfer')
+        else:
+            purchase_requests._process_purchase_approval()
+            stock_requests._process_stock_approval()
 
         return res
 
-    def _create_purchase_order(self):
-        """Create purchase order from approved request (fallback method)"""
+    def _use_async_side_effects(self):
+        """Whether post-approval side effects run in the background job queue
+
+        Enabled with the ``platinum_proj.async_approval_side_effects``
+        system parameter.
+        """
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'platinum_proj.async_approval_side_effects', 'False'))
+
+    def _process_purchase_approval(self):
+        """Create the purchase orders of approved purchase requests
+
+        Requests that already have a purchase order are left alone, so
+        running this again (e.g. a retried job) is harmless.
+        """
+        requests = self.filtered(
+            lambda r: not r.purchase_order_id and not r.product_line_ids.purchase_order_line_id
+        )
+        if self._use_purchase_consolidation():
+            requests._create_consolidated_purchase_orders()
+            return
+
+        for request in requests:
+            # Check if we have the approvals_purchase addon functionality
+            if (hasattr(request, 'action_create_purchase_orders') and
+                request.product_line_ids):
+                # Use the standard approvals_purchase flow if available;
+                # its errors are reported, not hidden behind another flow
+                request._ensure_purchase_supplier_info()
+                request.action_create_purchase_orders()
+            else:
+                # Use our custom method for non-purchase type categories
+                request._create_purchase_order()
+
+    def _process_stock_approval(self):
+        """Create the internal transfers of approved stock requisitions"""
+        requests = self.filtered(lambda r: not r.stock_picking_id)
+        if self._use_stock_transfer_waves():
+            requests._create_stock_transfer_waves()
+            return
+
+        # One availability check for the whole batch, before any reservation
+        requests._check_stock_availability()
+        for request in requests:
+            request._create_stock_transfer()
+
+    def _use_stock_transfer_waves(self):
+        """Whether approved stock requisitions are grouped into wave transfers
+
+        Enabled with the ``stock_transfer_waves`` context key or the
+        ``platinum_proj.stock_transfer_waves`` system parameter.
+        """
+        if 'stock_transfer_waves' in self.env.context:
+            return bool(self.env.context['stock_transfer_waves'])
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'platinum_proj.stock_transfer_waves', 'False'))
+
+    def _use_purchase_consolidation(self):
+        """Whether approved purchase requests are grouped into shared RFQs
+
+        Enabled with the ``consolidate_purchase_orders`` context key or the
+        ``platinum_proj.consolidate_purchase_orders`` system parameter.
+        """
+        if 'consolidate_purchase_orders' in self.env.context:
+            return bool(self.env.context['consolidate_purchase_orders'])
+        return str2bool(self.env['ir.config_parameter'].sudo().get_param(
+            'platinum_proj.consolidate_purchase_orders', 'False'))
+
+    def _get_purchase_currency(self, vendor):
         self.ensure_one()
+        return vendor.property_purchase_currency_id or self.company_id.currency_id
 
-        if not self.partner_id:
-            raise UserError(_('Please specify a vendor before creating purchase order.'))
+    def _ensure_purchase_supplier_info(self):
+        """Create supplier info for requested products that have no vendor yet"""
+        supplierinfo_vals = []
+        products_done = set()
+        for request in self:
+            for line in request.product_line_ids:
+                product = line.product_id
+                if product and not product.seller_ids and product.id not in products_done:
+                    products_done.add(product.id)
+                    supplierinfo_vals.append({
+                        'partner_id': (line.vendor_id or request.partner_id).id,
+                        'product_tmpl_id': product.product_tmpl_id.id,
+                        'min_qty': 1,
+                        'price': product.standard_price or 0,
+                        'company_id': request.company_id.id,
+                    })
+        if supplierinfo_vals:
+            self.env['product.supplierinfo'].sudo().create(supplierinfo_vals)
 
-        # Ensure product lines have proper vendor information for purchase
-        for line in self.product_line_ids:
-            if line.product_id and not line.product_id.seller_ids:
-                # Create supplier info for the product if it doesn't exist
-                self.env['product.supplierinfo'].sudo().create({
-                    'partner_id': self.partner_id.id,
-                    'product_tmpl_id': line.product_id.product_tmpl_id.id,
-                    'min_qty': 1,
-                    'price': line.product_id.standard_price or 0,
-                    'company_id': self.company_id.id,
-                })
+    def _prepare_purchase_order_lines(self, date_planned):
+        """Purchase order line values for this request (without order_id)"""
+        return [line_vals for _line, line_vals in self._get_purchase_order_line_items(date_planned)]
 
-        po_vals = {
-            'partner_id': self.partner_id.id,
-            'origin': self.name,
-            'company_id': self.company_id.id,
-            'currency_id': self.company_id.currency_id.id,
-        }
+    def _get_purchase_order_line_items(self, date_planned):
+        """Return ``(approval product line, purchase line values)`` pairs
 
-        # Create purchase order lines
-        order_lines = []
+        The approval line is empty for the generic line of amount-based
+        requests. Prices are in the company currency.
+        """
+        self.ensure_one()
+        lines_vals = []
         if self.product_line_ids:
             for line in self.product_line_ids:
                 if line.product_id:
-                    # Use proper purchase order line creation
-                    order_lines.append((0, 0, {
+                    lines_vals.append((line, {
                         'product_id': line.product_id.id,
                         'name': line.description or line.product_id.name,
                         'product_qty': line.quantity,
                         'product_uom': line.product_id.sudo().uom_po_id.id,
                         'price_unit': line.product_id.standard_price or 0,
-                        'date_planned': fields.Datetime.now(),
+                        'date_planned': date_planned,
                     }))
                 else:
                     # For products without ID (custom descriptions)
-                    order_lines.append((0, 0, {
+                    lines_vals.append((line, {
                         'name': line.description,
                         'product_qty': line.quantity,
                         'product_uom': 1,  # Units
                         'price_unit': 0,
-                        'date_planned': fields.Datetime.now(),
+                        'date_planned': date_planned,
                     }))
         elif self.amount:
             # Generic line for amount-based requests
-            order_lines.append((0, 0, {
+            lines_vals.append((self.env['approval.product.line'], {
                 'name': self.name,
                 'product_qty': self.quantity or 1,
                 'product_uom': 1,
                 'price_unit': self.amount,
-                'date_planned': fields.Datetime.now(),
+                'date_planned': date_planned,
             }))
+        return lines_vals
+
+    def _get_quotation_attachments(self):
+        """Return the quotations attached to these requests
+
+        Purchase orders reference them through ``approval_quotation_ids``
+        rather than holding copies.
+        """
+        return self.env['ir.attachment'].search([
+            ('res_model', '=', self._name),
+            ('res_id', 'in', self.ids),
+            ('approval_role', '=', 'quotation'),
+        ])
 
-        po_vals['order_line'] = order_lines
+    def _create_purchase_order(self):
+        """Create purchase order from approved request (fallback method)"""
+        self.ensure_one()
+
+        if not self.partner_id:
+            raise UserError(_('Please specify a vendor before creating purchase order.'))
+
+        # Ensure product lines have proper vendor information for purchase
+        self._ensure_purchase_supplier_info()
+
+        po_vals = {
+            'partner_id': self.partner_id.id,
+            'origin': self.name,
+            'company_id': self.company_id.id,
+            'currency_id': self.company_id.currency_id.id,
+        }
+
+        # Create purchase order lines
+        po_vals['order_line'] = [
+            (0, 0, line_vals)
+            for line_vals in self._prepare_purchase_order_lines(fields.Datetime.now())
+        ]
 
         purchase_order = self.env['purchase.order'].create(po_vals)
         self.purchase_order_id = purchase_order.id
 
-        # Link quotation attachments to the purchase order
-        quotation_attachments = self.attachment_ids.filtered(
-            lambda att: att.description == 'Quotation'
-        )
-        for attachment in quotation_attachments:
-            attachment.copy({
-                'res_model': 'purchase.order',
-                'res_id': purchase_order.id,
-                'name': f"Quotation - {attachment.name}",
-            })
+        # Quotations are shown on the purchase order by reference
+        quotation_attachments = self._get_quotation_attachments()
 
         # Post message about PO creation with links to quotations
         message_body = _('Purchase Order %s created from this approval request.') % purchase_order.name
@@ -264,8 +671,73 @@ class ApprovalRequest(models.Model):
 
         return purchase_order
 
+    def _create_consolidated_purchase_orders(self):
+        """Create one RFQ per (vendor, company, currency) for these requests
+
+        Each line goes to the RFQ of its preferred vendor, or of the
+        request's vendor, with its company-currency price converted to the
+        vendor's purchase currency. All order lines are created with a
+        single ``create`` call and linked back to their approval lines;
+        each request is linked to the RFQ of its first line. A single
+        message listing the source requests is posted on each RFQ.
+
+        :return: purchase.order recordset
+        """
+        if not self:
+            return self.env['purchase.order']
+
+        self._ensure_purchase_supplier_info()
+
+        date_planned = fields.Datetime.now()
+        groups = {}
+        for request in self:
+            company = request.company_id
+            for approval_line, line_vals in request._get_purchase_order_line_items(date_planned):
+                vendor = approval_line.vendor_id or request.partner_id
+                currency = request._get_purchase_currency(vendor)
+                if currency != company.currency_id:
+                    line_vals['price_unit'] = company.currency_id._convert(
+                        line_vals['price_unit'], currency, company, date_planned)
+                groups.setdefault((vendor, company, currency), []).append((request, approval_line, line_vals))
+
+        purchase_orders = self.env['purchase.order'].create([{
+            'partner_id': vendor.id,
+            'origin': ', '.join(dict.fromkeys(request.name for request, _line, _vals in items)),
+            'company_id': company.id,
+            'currency_id': currency.id,
+        } for (vendor, company, currency), items in groups.items()])
+
+        order_lines_vals = []
+        approval_lines = []
+        requests_by_order = {}
+        for purchase_order, items in zip(purchase_orders, groups.values()):
+            for request, approval_line, line_vals in items:
+                line_vals['order_id'] = purchase_order.id
+                order_lines_vals.append(line_vals)
+                approval_lines.append(approval_line)
+                requests_by_order.setdefault(purchase_order, self.browse())
+                requests_by_order[purchase_order] |= request
+                if not request.purchase_order_id:
+                    request.purchase_order_id = purchase_order
+        order_lines = self.env['purchase.order.line'].create(order_lines_vals)
+        for approval_line, order_line in zip(approval_lines, order_lines):
+            if approval_line:
+                approval_line.purchase_order_line_id = order_line
+
+        for purchase_order, requests in requests_by_order.items():
+            purchase_order.message_post(
+                body=_('Created from approval requests: %s') % ', '.join(requests.mapped('name')),
+                message_type='notification'
+            )
+
+        return purchase_orders
+
     def _create_stock_transfer(self):
-        """Create internal stock transfer from approved request"""
+        """Create internal stock transfer from approved request
+
+        Stock availability is checked beforehand by the caller, for all the
+        requests being approved at once (see ``_process_stock_approval``).
+        """
         self.ensure_one()
 
         if not self.source_location_id or not self.dest_location_id:
@@ -274,17 +746,8 @@ class ApprovalRequest(models.Model):
         if not self.product_line_ids:
             raise UserError(_('At least one product line is required for stock requisition.'))
 
-        # Check product availability first
-        self._check_stock_availability()
-
         # Get internal picking type
-        internal_picking_type = self.env['stock.picking.type'].search([
-            ('code', '=', 'internal'),
-            ('company_id', '=', self.company_id.id)
-        ], limit=1)
-
-        if not internal_picking_type:
-            raise UserError(_('No internal picking type found for company %s') % self.company_id.name)
+        internal_picking_type = self._get_internal_picking_type()
 
         # Create stock picking
         picking_vals = {
@@ -311,6 +774,7 @@ class ApprovalRequest(models.Model):
                     'location_id': self.source_location_id.id,
                     'location_dest_id': self.dest_location_id.id,
                     'company_id': self.company_id.id,
+                    'approval_request_id': self.id,
                 }
                 self.env['stock.move'].create(move_vals)
 
@@ -329,35 +793,160 @@ class ApprovalRequest(models.Model):
 
         return picking
 
-    def _check_stock_availability(self):
-        """Check if requested products are available in source location"""
+    def _get_internal_picking_type(self):
+        """Return the internal picking type of the request's company"""
         self.ensure_one()
+        internal_picking_type = self.env['stock.picking.type'].search([
+            ('code', '=', 'internal'),
+            ('company_id', '=', self.company_id.id)
+        ], limit=1)
 
-        unavailable_products = []
+        if not internal_picking_type:
+            raise UserError(_('No internal picking type found for company %s') % self.company_id.name)
+        return internal_picking_type
+
+    def _create_stock_transfer_waves(self):
+        """Create internal transfers for approved requests, one per wave
+
+        Requests sharing a company and a (source, destination) pair form a
+        wave: their moves are added to one picking, either an open wave
+        transfer (``is_approval_wave``) that has not been printed yet or a
+        new one. Transfers of single requests are never reused. All moves are
+        created in a single call and reservation runs once for all waves.
+        Each move keeps a link to the request it fulfils.
+
+        :return: the wave pickings
+        """
+        requests = self.filtered(lambda r: not r.stock_picking_id)
+        for request in requests:
+            if not request.source_location_id or not request.dest_location_id:
+                raise UserError(_('Source and destination locations are required for stock requisition.'))
+            if not request.product_line_ids:
+                raise UserError(_('At least one product line is required for stock requisition.'))
+
+        requests._check_stock_availability()
+
+        waves = requests.grouped(
+            lambda r: (r.company_id, r.source_location_id, r.dest_location_id)
+        )
 
-        for line in self.product_line_ids:
-            if line.product_id and line.quantity > 0:
-                # Check available quantity in source location
-                available_qty = self.env['stock.quant']._get_available_quantity(
-                    line.product_id,
-                    self.source_location_id,
-                    strict=True
-                )
+        Picking = self.env['stock.picking']
+        pickings = Picking.browse()
+        move_vals_list = []
+        for (company, source, dest), wave_requests in waves.items():
+            picking_type = wave_requests[0]._get_internal_picking_type()
+            picking = Picking.search([
+                ('is_approval_wave', '=', True),
+                ('picking_type_id', '=', picking_type.id),
+                ('location_id', '=', source.id),
+                ('location_dest_id', '=', dest.id),
+                ('state', 'in', ('draft', 'confirmed', 'waiting', 'assigned')),
+                ('printed', '=', False),
+            ], order='id desc', limit=1)
+            if not picking:
+                partners = wave_requests.employee_id.work_contact_id
+                picking = Picking.create({
+                    'picking_type_id': picking_type.id,
+                    'location_id': source.id,
+                    'location_dest_id': dest.id,
+                    'origin': _('Stock Requisition Wave'),
+                    'company_id': company.id,
+                    'move_type': 'direct',
+                    'partner_id': partners.id if len(partners) == 1 else False,
+                    'is_approval_wave': True,
+                })
+            pickings |= picking
+            wave_requests.stock_picking_id = picking
+
+            for request in wave_requests:
+                for line in request.product_line_ids:
+                    if line.product_id and line.quantity > 0:
+                        move_vals_list.append({
+                            'name': line.product_id.name,
+                            'product_id': line.product_id.id,
+                            'product_uom_qty': line.quantity,
+                            'product_uom': line.product_id.sudo().uom_id.id,
+                            'picking_id': picking.id,
+                            'location_id': source.id,
+                            'location_dest_id': dest.id,
+                            'company_id': company.id,
+                            'origin': request.name,
+                            'approval_request_id': request.id,
+                        })
+
+        self.env['stock.move'].create(move_vals_list)
+        requests.stock_availability_checked = True
+
+        # Confirm the new moves and reserve once for every wave
+        pickings.action_confirm()
+        pickings.action_assign()
+
+        requests._message_log_batch(bodies={
+            request.id: _('Internal Transfer %s created from this stock requisition request.')
+            % request.stock_picking_id.name
+            for request in requests
+        })
+
+        return pickings
+
+    def _get_stock_shortfalls(self):
+        """Return the product lines of these requests that stock cannot cover
+
+        Availability of every (product, source location) pair is read with
+        a single grouped ``stock.quant`` query for all requests. Lines
+        drawing the same product from the same location share what is
+        available, in request then line order. Lines of requests without a
+        source location have nothing available.
+
+        :return: list of dicts with ``request_id``, ``line_id``,
+                 ``product_id``, ``product_name``, ``location_id``,
+                 ``requested``, ``available`` and ``missing``
+        """
+        lines = self.product_line_ids.filtered(
+            lambda l: l.product_id and l.quantity > 0
+        ).sorted(lambda l: (l.approval_request_id.id, l.id))
+        if not lines:
+            return []
+
+        availability = self.env['stock.quant']._get_available_quantity_map(
+            lines.product_id, self.source_location_id)
+
+        shortfalls = []
+        for line in lines:
+            key = (line.product_id.id, line.approval_request_id.source_location_id.id)
+            available_qty = availability.get(key, 0.0)
+            availability[key] = max(available_qty - line.quantity, 0.0)
+            if available_qty < line.quantity:
+                shortfalls.append({
+                    'request_id': line.approval_request_id.id,
+                    'line_id': line.id,
+                    'product_id': line.product_id.id,
+                    'product_name': line.product_id.name,
+                    'location_id': key[1],
+                    'requested': line.quantity,
+                    'available': available_qty,
+                    'missing': line.quantity - available_qty,
+                })
+        return shortfalls
+
+    @api.model
+    def _format_stock_shortfalls(self, shortfalls):
+        """Render shortfalls from ``_get_stock_shortfalls`` for a message"""
+        message = _('Insufficient stock available:\n')
+        for item in shortfalls:
+            message += _('• %s: Requested %.2f, Available %.2f\n') % (
+                item['product_name'], item['requested'], item['available']
+            )
+        return message
 
-                if available_qty < line.quantity:
-                    unavailable_products.append({
-                        'product': line.product_id.name,
-                        'requested': line.quantity,
-                        'available': available_qty,
-                    })
+    def _check_stock_availability(self):
+        """Check if requested products are available in source location
 
-        if unavailable_products:
-            error_msg = _('Insufficient stock available:\n')
-            for item in unavailable_products:
-                error_msg += _('• %s: Requested %.2f, Available %.2f\n') % (
-                    item['product'], item['requested'], item['available']
-                )
-            raise UserError(error_msg)
+        :raise UserError: listing the lines stock cannot cover
+        """
+        shortfalls = self._get_stock_shortfalls()
+        if shortfalls:
+            raise UserError(self._format_stock_shortfalls(shortfalls))
 
         # Mark stock as checked
         self.stock_availability_checked = True
@@ -365,46 +954,45 @@ class ApprovalRequest(models.Model):
     def action_check_stock_availability(self):
         """Manual action to check stock availability"""
         self.ensure_one()
-        try:
-            self._check_stock_availability()
-            return {
-                'type': 'ir.actions.client',
-                'tag': 'display_notification',
-                'params': {
-                    'title': _('Stock Check'),
-                    'message': _('All requested products are available in the source location.'),
-                    'type': 'success',
-                    'sticky': False,
-                }
-            }
-        except UserError as e:
+        shortfalls = self._get_stock_shortfalls()
+        if shortfalls:
             return {
                 'type': 'ir.actions.client',
                 'tag': 'display_notification',
                 'params': {
                     'title': _('Stock Check Failed'),
-                    'message': str(e),
+                    'message': self._format_stock_shortfalls(shortfalls),
                     'type': 'warning',
                     'sticky': True,
                 }
             }
 
+        self.stock_availability_checked = True
+        return {
+            'type': 'ir.actions.client',
+            'tag': 'display_notification',
+            'params': {
+                'title': _('Stock Check'),
+                'message': _('All requested products are available in the source location.'),
+                'type': 'success',
+                'sticky': False,
+            }
+        }
+
     def _check_budget_availability(self):
         """Check if budget is available for this request"""
         if not self.budget_line_id or not self.amount:
             return True
 
-        # Get current month's spending for this budget category
-        domain = [
-            ('budget_line_id', '=', self.budget_line_id.id),
-            ('request_status', '=', 'approved'),
-            ('create_date', '>=', fields.Datetime.now().replace(day=1)),
-            ('id', '!=', self.id)  # Exclude current request
-        ]
-
-        spent_amount = sum(
-            self.search(domain).mapped('amount')
+        # Current month's approved spending for this budget category
+        ledger = self.env['approval.budget.ledger']._get_ledger(
+            self.budget_line_id,
+            self.company_id,
+            self.env['approval.budget.ledger']._month_of(),
         )
+        spent_amount = ledger.approved_amount
+        if self.request_status == 'approved' and self.budget_ledger_id == ledger:
+            spent_amount -= self.amount  # Exclude current request
 
         available_budget = self.budget_line_id.budget or 0
         return (spent_amount + self.amount) <= available_budget
@@ -422,14 +1010,77 @@ class ApprovalRequest(models.Model):
 
     def action_confirm(self):
         """Override confirm action for portal-specific logic"""
-        # Validate budget before confirmation
-        for request in self:
-            if not request._check_budget_availability():
+        with self._track_budget_ledger() as tracked:
+            res = super(ApprovalRequest, tracked).action_confirm()
+            tracked.budget_date = fields.Date.context_today(self)
+        # Reserve once pending, so the reservation starts as reserved; a
+        # budget error still rolls the confirmation back
+        self._reserve_budget()
+        return res
+
+    @api.model
+    def _lock_budget_ledger(self, budget_line, company):
+        """Lock the current month's ledger row of a budget
+
+        Portal submissions call this before their heavy work (vendors,
+        products, attachments), so a concurrent submission on the same
+        budget waits, or is retried by the server, before doing any.
+        """
+        if not budget_line:
+            return
+        Ledger = self.env['approval.budget.ledger']
+        Ledger._get_ledger(budget_line, company, Ledger._month_of(), create=True)._lock_for_reservation()
+
+    def _reserve_budget(self):
+        """Reserve the request amounts on their monthly budget rows
+
+        The ledger rows involved are locked for the rest of the transaction,
+        so concurrent submissions on the same budget are serialized on one
+        small row while other budgets are unaffected. Approved amounts plus
+        reservations held by other pending requests must leave room for
+        the request. The reservation follows the request status: it is
+        consumed on approval and released on refusal or cancellation.
+        Requests left without budget category or amount drop theirs.
+
+        Ledger totals must be up to date, so this does not run inside a
+        ``_track_budget_ledger`` block.
+        """
+        with self.sudo()._track_budget_ledger() as tracked:
+            tracked._reserve_budget_tracked()
+
+    def _reserve_budget_tracked(self):
+        """Body of ``_reserve_budget``, run with ledger tracking"""
+        requests = self.filtered(lambda r: r.budget_line_id and r.amount)
+        (self - requests).budget_reservation_ids.unlink()
+        if not requests:
+            return
+
+        requests._assign_budget_ledger()
+        requests.budget_ledger_id._lock_for_reservation()
+
+        Reservation = self.env['approval.budget.reservation'].sudo()
+        reserved_now = {}
+        for request in requests:
+            ledger = request.budget_ledger_id
+            reservation = request.budget_reservation_ids[:1]
+            held = reservation.amount if reservation.state == 'reserved' and reservation.ledger_id == ledger else 0.0
+            reserved_by_others = ledger.reserved_amount - held + reserved_now.get(ledger, 0.0)
+
+            available_budget = request.budget_line_id.budget or 0
+            if ledger.approved_amount + reserved_by_others + request.amount > available_budget:
                 raise UserError(_(
                     'Cannot submit request: insufficient budget available for %s'
                 ) % (request.budget_line_id.name or 'this category'))
 
-        return super().action_confirm()
+            if reservation:
+                reservation.write({'ledger_id': ledger.id, 'amount': request.amount})
+            else:
+                Reservation.create({
+                    'request_id': request.id,
+                    'ledger_id': ledger.id,
+                    'amount': request.amount,
+                })
+            reserved_now[ledger] = reserved_now.get(ledger, 0.0) + request.amount
 
     def get_portal_url(self, suffix=None, report_type=None, download=None, query_string=None):
         """Get portal URL for this approval request"""
@@ -0,0 +1,209 @@
+# -*- coding: utf-8 -*-
+
+import logging
+from datetime import timedelta
+
+from odoo import api, fields, models
+
+_logger = logging.getLogger(__name__)
+
+JOB_BATCH_SIZE = 50
+BACKOFF_BASE = timedelta(minutes=1)
+BACKOFF_MAX = timedelta(hours=6)
+
+
+class ApprovalRequestJob(models.Model):
+    _name = 'approval.request.job'
+    _description = 'Approval Side-Effect Job'
+    _order = 'next_attempt_date, id'
+    _rec_name = 'request_id'
+
+    request_id = fields.Many2one(
+        'approval.request',
+        string='Approval Request',
+        required=True,
+        ondelete='cascade',
+        index=True
+    )
+    job_type = fields.Selection([
+        ('purchase_order', 'Create Purchase Order'),
+        ('stock_transfer', 'Create Internal Transfer'),
+    ], string='Job', required=True)
+    state = fields.Selection([
+        ('pending', 'Pending'),
+        ('done', 'Done'),
+        ('failed', 'Failed'),
+    ], string='Status', default='pending', required=True)
+    attempts = fields.Integer(string='Failed Attempts', default=0)
+    max_attempts = fields.Integer(string='Max Attempts', default=5)
+    next_attempt_date = fields.Datetime(
+        string='Next Attempt',
+        default=fields.Datetime.now,
+        required=True
+    )
+    grouped = fields.Boolean(
+        string='Grouped',
+        readonly=True,
+        help='Run together with the other pending grouped jobs of its type, a batch at a time: '
+             'consolidated RFQs for purchases, wave transfers for stock requisitions'
+    )
+    last_error = fields.Text(string='Last Error', readonly=True)
+    date_done = fields.Datetime(string='Done On', readonly=True)
+
+    _sql_constraints = [
+        ('request_job_type_uniq', 'unique(request_id, job_type)',
+         'An approval request can only have one job of each type.'),
+    ]
+
+    def init(self):
+        super().init()
+        self.env.cr.execute("""
+            CREATE INDEX IF NOT EXISTS approval_request_job_pending_idx
+                ON approval_request_job (next_attempt_date, id)
+             WHERE state = 'pending'
+        """)
+
+    @api.model
+    def _enqueue(self, requests, job_type):
+        """Queue a side effect for requests, at most once per request and type
+
+        An existing job is reused (and rescheduled if it had failed), which
+        makes approving twice idempotent. Whether the job is grouped is
+        decided here, with the caller's context and settings, since the
+        worker runs without them.
+        """
+        if not requests:
+            return self.browse()
+
+        if job_type == 'purchase_order':
+            grouped = requests._use_purchase_consolidation()
+        else:
+            grouped = requests._use_stock_transfer_waves()
+
+        Job = self.sudo()
+        jobs = Job.search([('request_id', 'in', requests.ids), ('job_type', '=', job_type)])
+        jobs.filtered(lambda j: j.state != 'done').grouped = grouped
+        jobs.filtered(lambda j: j.state == 'failed').action_retry()
+
+        new_requests = requests - jobs.request_id
+        jobs |= Job.create([{
+            'request_id': request.id,
+            'job_type': job_type,
+            'grouped': grouped,
+        } for request in new_requests])
+
+        self._trigger_worker()
+        return jobs
+
+    @api.model
+    def _trigger_worker(self):
+        self.env.ref('platinum_proj.cron_process_approval_jobs').sudo()._trigger()
+
+    def action_retry(self):
+        self.write({
+            'state': 'pending',
+            'attempts': 0,
+            'next_attempt_date': fields.Datetime.now(),
+        })
+        self._trigger_worker()
+
+    @api.model
+    def _cron_process_jobs(self, batch_size=JOB_BATCH_SIZE):
+        """Run due jobs; jobs locked by a concurrent worker are skipped
+
+        Grouped jobs are taken up to ``batch_size`` per job type and each
+        type runs as one batch, so that one RFQ per vendor or one transfer
+        per wave covers them. Other jobs are taken ``batch_size`` at a
+        time. Each run stays bounded whatever the backlog, and the worker
+        runs again right away while batches come back full.
+        """
+        self.flush_model()
+        grouped_jobs = self.browse()
+        more = False
+        for job_type in ('purchase_order', 'stock_transfer'):
+            self.env.cr.execute("""
+                SELECT id FROM approval_request_job
+                 WHERE state = 'pending'
+                   AND grouped
+                   AND job_type = %s
+                   AND next_attempt_date <= now() at time zone 'UTC'
+              ORDER BY id
+                 LIMIT %s
+                   FOR UPDATE SKIP LOCKED
+            """, [job_type, batch_size])
+            type_jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+            more = more or len(type_jobs) == batch_size
+            grouped_jobs |= type_jobs
+        self.env.cr.execute("""
+            SELECT id FROM approval_request_job
+             WHERE state = 'pending'
+               AND grouped IS NOT TRUE
+               AND next_attempt_date <= now() at time zone 'UTC'
+          ORDER BY next_attempt_date, id
+             LIMIT %s
+               FOR UPDATE SKIP LOCKED
+        """, [batch_size])
+        jobs = self.browse([row[0] for row in self.env.cr.fetchall()])
+        more = more or len(jobs) == batch_size
+
+        for job_type in ('purchase_order', 'stock_transfer'):
+            (grouped_jobs | jobs).filtered(lambda j: j.job_type == job_type)._run()
+
+        if more:
+            # More work may be waiting, run again right away
+            self._trigger_worker()
+        return len(grouped_jobs) + len(jobs)
+
+    def _run(self):
+        """Run jobs of a single type, grouped jobs in a single batch"""
+        if not self:
+            return
+        grouped_jobs = self.filtered('grouped')
+        if grouped_jobs and grouped_jobs._run_batch():
+            jobs = self - grouped_jobs
+        else:
+            # Isolate the failure of a group, or run ungrouped jobs
+            jobs = self
+        for job in jobs:
+            job._run_batch()
+
+    def _run_batch(self):
+        """Run jobs inside one savepoint, recording success or failure
+
+        The grouping chosen at approval time is passed on through the
+        context keys read by the request handlers.
+        """
+        grouped = all(self.mapped('grouped'))
+        requests = self.request_id.sudo().with_context(
+            consolidate_purchase_orders=grouped,
+            stock_transfer_waves=grouped,
+        )
+        try:
+            with self.env.cr.savepoint():
+                if self[0].job_type == 'purchase_order':
+                    requests._process_purchase_approval()
+                else:
+                    requests._process_stock_approval()
+        except Exception as e:
+            if len(self) == 1:
+                self._record_failure(e)
+            return False
+
+        self.write({
+            'state': 'done',
+            'date_done': fields.Datetime.now(),
+            'last_error': False,
+        })
+        return True
+
+    def _record_failure(self, error):
+        self.ensure_one()
+        _logger.warning("Approval job %s (%s) failed: %s", self.id, self.job_type, error)
+        attempts = self.attempts + 1
+        delay = min(BACKOFF_BASE * (2 ** (attempts - 1)), BACKOFF_MAX)
+        self.write({
+            'attempts': attempts,
+            'state': 'failed' if attempts >= self.max_attempts else 'pending',
+            'next_attempt_date': fields.Datetime.now() + delay,
+            'last_error': str(error),
+        })
@@ -1,6 +1,16 @@
 # -*- coding: utf-8 -*-
 
-from odoo import fields, models, api
+import logging
+from datetime import timedelta
+
+from odoo import fields, models, api, tools
+
+_logger = logging.getLogger(__name__)
+
+WATERMARK_PARAM = 'platinum_proj.link_portal_users_watermark'
+WATERMARK_MARGIN = timedelta(minutes=5)
+# Fields whose change may alter which employee a user resolves to
+USER_RESOLUTION_FIELDS = {'user_id', 'work_email', 'active'}
 
 
 class HrEmployee(models.Model):
@@ -18,6 +28,85 @@ class HrEmployee(models.Model):
         compute='_compute_approval_request_count'
     )
 
+    # Searched by ``_get_employee_ids_for_users``
+    work_email = fields.Char(index=True)
+
+    @api.model_create_multi
+    def create(self, vals_list):
+        employees = super().create(vals_list)
+        if any(USER_RESOLUTION_FIELDS & vals.keys() for vals in vals_list):
+            self.env.registry.clear_cache()
+        return employees
+
+    def write(self, vals):
+        res = super().write(vals)
+        if USER_RESOLUTION_FIELDS & vals.keys():
+            self.env.registry.clear_cache()
+        return res
+
+    def unlink(self):
+        resolved = self.filtered(lambda e: e.user_id or e.work_email)
+        res = super().unlink()
+        if resolved:
+            self.env.registry.clear_cache()
+        return res
+
+    @api.model
+    def _get_employee_ids_for_users(self, users, match_email=True):
+        """Resolve the employees of many users with at most two queries
+
+        The direct ``user_id`` link wins over a ``work_email`` match on the
+        user's email: one ``user_id IN`` search, then one ``work_email IN``
+        search for the users left, both served by indexes.
+
+        :param users: res.users recordset
+        :param match_email: fall back on the ``work_email`` match
+        :return: dict {user_id: employee_id or False}
+        """
+        Employee = self.sudo()
+        result = dict.fromkeys(users.ids, False)
+        if not users:
+            return result
+
+        for employee in Employee.search([('user_id', 'in', users.ids)]):
+            if not result[employee.user_id.id]:
+                result[employee.user_id.id] = employee.id
+
+        users_by_email = {}
+        if match_email:
+            for user in users.sudo():
+                if not result[user.id] and user.email:
+                    users_by_email.setdefault(user.email, []).append(user.id)
+        if users_by_email:
+            for employee in Employee.search([('work_email', 'in', list(users_by_email))]):
+                for user_id in users_by_email.pop(employee.work_email, []):
+                    result[user_id] = employee.id
+        return result
+
+    @api.model
+    def _get_employee_for_user(self, user):
+        """Return the (sudo) employee linked to ``user``, possibly empty
+
+        Resolved once per user, see ``_get_employee_id_for_user``.
+        """
+        if not user:
+            return self.sudo().browse()
+        return self.sudo().browse(self._get_employee_id_for_user(user.id))
+
+    @api.model
+    @tools.ormcache('user_id')
+    def _get_employee_id_for_user(self, user_id):
+        """Resolve the employee of a user, cached per user id
+
+        The cache is only cleared when an employee's ``user_id``,
+        ``work_email`` or ``active`` flag changes, when such an employee is
+        created or deleted, and when the email of a user or of an employee
+        work contact changes.
+
+        :return: employee id or False
+        """
+        return self._get_employee_ids_for_users(self.env['res.users'].browse(user_id))[user_id]
+
     @api.depends('approval_request_ids')
     def _compute_approval_request_count(self):
         """Count approval requests for this employee"""
@@ -41,24 +130,68 @@ class HrEmployee(models.Model):
 
     @api.model
     def link_portal_users(self):
-        """Simple method to link portal users to employees by email"""
-        # Find employees with work_email but no user_id
-        employees_without_user = self.search([
-            ('work_email', '!=', False),
-            ('user_id', '=', False)
-        ])
-
-        linked_count = 0
-        for employee in employees_without_user:
-            # Look for portal user with matching email
-            portal_user = self.env['res.users'].search([
-                ('email', '=', employee.work_email),
-                ('share', '=', True),  # Portal user
-            ], limit=1)
-
-            if portal_user:
-                # Link them together
-                employee.user_id = portal_user.id
-                linked_count += 1
-
-        return f"Linked {linked_count} employees to portal users"
\ No newline at end of file
+        """Link portal users to employees by normalized email
+
+        Employees without user and portal users are matched with a single
+        join on ``lower(trim(email))``. Only employees, users or user
+        partners changed since the last successful run are considered,
+        using a watermark kept in ``platinum_proj.link_portal_users_watermark``.
+
+        :return: dict with the number of ``linked`` employees, ``ambiguous``
+                 ones (several candidate users, or a user matching several
+                 employees) and ``skipped`` ones (user already linked to an
+                 employee of the same company)
+        """
+        ICP = self.env['ir.config_parameter'].sudo()
+        watermark = ICP.get_param(WATERMARK_PARAM) or '1970-01-01 00:00:00'
+
+        self.env.cr.execute("SELECT now() at time zone 'UTC'")
+        run_started = self.env.cr.fetchone()[0]
+
+        self.flush_model(['user_id', 'work_email', 'active', 'company_id'])
+        self.env['res.users'].flush_model(['share', 'active', 'partner_id'])
+        self.env['res.partner'].flush_model(['email'])
+        self.env.cr.execute("""
+            SELECT e.id,
+                   array_agg(DISTINCT u.id),
+                   bool_or(EXISTS (
+                       SELECT 1 FROM hr_employee linked
+                        WHERE linked.user_id = u.id
+                          AND linked.company_id = e.company_id
+                   ))
+              FROM hr_employee e
+              JOIN res_partner p ON lower(trim(p.email)) = lower(trim(e.work_email))
+              JOIN res_users u ON u.partner_id = p.id
+             WHERE e.user_id IS NULL
+               AND e.active
+               AND e.work_email IS NOT NULL
+               AND u.share
+               AND u.active
+               AND (e.write_date >= %(since)s
+                    OR u.write_date >= %(since)s
+                    OR p.write_date >= %(since)s)
+          GROUP BY e.id
+        """, {'since': watermark})
+        matches = self.env.cr.fetchall()
+
+        result = {'linked': 0, 'ambiguous': 0, 'skipped': 0}
+        employee_count_by_user = {}
+        for _employee_id, user_ids, _already_linked in matches:
+            for user_id in user_ids:
+                employee_count_by_user[user_id] = employee_count_by_user.get(user_id, 0) + 1
+
+        for employee_id, user_ids, already_linked in matches:
+            if len(user_ids) > 1 or employee_count_by_user[user_ids[0]] > 1:
+                result['ambiguous'] += 1
+            elif already_linked:
+                result['skipped'] += 1
+            else:
+                self.browse(employee_id).user_id = user_ids[0]
+                result['linked'] += 1
+
+        # Rows written by transactions still running when this one started
+        # may carry an earlier write_date: keep a safety margin
+        ICP.set_param(WATERMARK_PARAM, fields.Datetime.to_string(run_started - WATERMARK_MARGIN))
+
+        _logger.info("Portal user linking: %(linked)s linked, %(ambiguous)s ambiguous, %(skipped)s skipped", result)
+        return result
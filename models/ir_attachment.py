@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+
+import hashlib
+import mmap
+import os
+import tempfile
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+
+STREAM_CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+# Mode of the files ``_file_write`` creates; the umask can only be read
+# by setting it, so it is read once at import
+_UMASK = os.umask(0)
+os.umask(_UMASK)
+FILE_MODE = 0o666 & ~_UMASK
+
+
+class IrAttachment(models.Model):
+    _inherit = 'ir.attachment'
+
+    approval_role = fields.Selection([
+        ('quotation', 'Quotation'),
+        ('supporting', 'Supporting Document'),
+    ], string='Approval Role', index='btree_not_null',
+        help='Role of a document attached to an approval request')
+
+    @api.model
+    def _backfill_approval_roles(self):
+        """Set the role of request attachments told apart by their description
+
+        Quotations used to be tagged with a fake ``res_field``, which hides
+        attachments from regular searches; it is cleared as well.
+        """
+        self.env.cr.execute("""
+            UPDATE ir_attachment
+               SET approval_role = CASE description
+                                       WHEN 'Quotation' THEN 'quotation'
+                                       ELSE 'supporting'
+                                   END,
+                   res_field = CASE
+                                   WHEN res_field LIKE 'quotation\\_vendor\\_%' THEN NULL
+                                   ELSE res_field
+                               END
+             WHERE res_model = 'approval.request'
+               AND approval_role IS NULL
+               AND description IN ('Quotation', 'Supporting Document')
+        """)
+        self.invalidate_model(['approval_role', 'res_field'])
+
+    @api.model
+    def _create_from_stream(self, stream, vals, chunk_size=STREAM_CHUNK_SIZE):
+        """Create an attachment from a binary file object, chunk by chunk
+
+        The content is copied to a temporary file in the filestore while
+        its SHA-1 checksum is computed, then moved to the path given by
+        ``_get_path``, so the upload is never held in memory nor base64
+        encoded. ``create`` ignores the filestore fields, so they are set
+        on the new record afterwards. With database storage the content
+        has to be read and the regular path is used.
+
+        :param stream: readable binary file object, positioned at the start
+        :param vals: values of the attachment, without ``raw``/``datas``
+        """
+        if self._storage() != 'file':
+            return self.create(dict(vals, raw=stream.read()))
+
+        filestore = self._filestore()
+        os.makedirs(filestore, exist_ok=True)
+        sha = hashlib.sha1()
+        size = 0
+        head = b''
+        fd, tmp_path = tempfile.mkstemp(dir=filestore, prefix='.upload-')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                while chunk := stream.read(chunk_size):
+                    if not head:
+                        head = chunk[:1024]
+                    sha.update(chunk)
+                    size += len(chunk)
+                    tmp.write(chunk)
+
+            if not size:
+                return self.create(dict(vals, raw=b''))
+
+            checksum = sha.hexdigest()
+            with open(tmp_path, 'rb') as tmp, mmap.mmap(tmp.fileno(), 0, access=mmap.ACCESS_READ) as content:
+                # Same path and collision check as regular attachments
+                fname, full_path = self._get_path(content, checksum)
+            if not os.path.isfile(full_path):
+                # mkstemp creates the file 0600; give it the mode files
+                # written by _file_write get
+                os.chmod(tmp_path, FILE_MODE)
+                os.replace(tmp_path, full_path)
+                # Removed by the filestore GC if the transaction aborts
+                self._mark_for_gc(fname)
+        finally:
+            if os.path.exists(tmp_path):
+                os.unlink(tmp_path)
+
+        attachment = self.create(dict(
+            vals,
+            mimetype=self._compute_mimetype(dict(vals, raw=head)),
+        ))
+        self.env.cr.execute(SQL(
+            "UPDATE ir_attachment SET store_fname = %s, file_size = %s, checksum = %s WHERE id = %s",
+            fname, size, checksum, attachment.id,
+        ))
+        attachment.invalidate_recordset(['store_fname', 'file_size', 'checksum', 'raw', 'datas'])
+        return attachment
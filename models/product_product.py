@@ -0,0 +1,225 @@
+# -*- coding: utf-8 -*-
+
+import logging
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+from odoo.tools.sql import create_index, escape_psql
+
+from ..tools import normalize_name
+
+_logger = logging.getLogger(__name__)
+
+PLACEHOLDER_MERGE_BATCH_SIZE = 500
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    portal_name_key = fields.Char(
+        string='Portal Name Key',
+        compute='_compute_portal_name_key',
+        store=True,
+        index=True,
+        help='Case, accent, punctuation and whitespace folded name used to reuse products for free-text lines'
+    )
+    is_portal_placeholder = fields.Boolean(
+        string='Portal Placeholder',
+        index='btree_not_null',
+        copy=False,
+        help='Created from a free-text portal line; merged into a matching catalog product by a scheduled job'
+    )
+
+    @api.depends('name')
+    def _compute_portal_name_key(self):
+        # Keyed on one language, whatever the language of the computing user
+        for template in self.with_context(lang='en_US'):
+            template.portal_name_key = normalize_name(template.name)
+
+    @api.model
+    def _cron_merge_portal_placeholders(self, batch_size=PLACEHOLDER_MERGE_BATCH_SIZE):
+        """Merge placeholder products into the catalog product of the same name
+
+        The canonical product of a name key is the oldest non-placeholder
+        template of the placeholder's company or shared by all companies,
+        or else the oldest such placeholder, which then stops being one.
+        Approval lines, RFQ lines and supplier infos of the merged
+        placeholders are moved to it and the placeholders archived.
+        Placeholders already used in stock moves, or whose unit of measure
+        is of another category than the target's (their quantities would
+        not convert), are kept as they are.
+
+        :return: number of placeholders merged
+        """
+        placeholders = self.search([('is_portal_placeholder', '=', True)], order='id', limit=batch_size)
+        if not placeholders:
+            return 0
+
+        # {(name key, company id or False): oldest catalog template, else placeholder}
+        canonical_by_key = {}
+        templates = self.search([
+            ('portal_name_key', 'in', list(set(placeholders.mapped('portal_name_key')) - {False})),
+            ('company_id', 'in', placeholders.company_id.ids + [False]),
+        ])
+        for template in templates.sorted(lambda t: (t.is_portal_placeholder, t.id)):
+            canonical_by_key.setdefault((template.portal_name_key, template.company_id.id), template)
+
+        moved_variant_ids = set(self.env['stock.move'].search([
+            ('product_id', 'in', placeholders.product_variant_ids.ids),
+        ]).product_id.ids)
+
+        to_merge = {}
+        kept = self.browse()
+        for placeholder in placeholders:
+            candidates = [
+                canonical_by_key[key]
+                for key in {(placeholder.portal_name_key, placeholder.company_id.id),
+                            (placeholder.portal_name_key, False)}
+                if key in canonical_by_key
+            ]
+            target = min(candidates, key=lambda t: (t.is_portal_placeholder, t.id), default=placeholder)
+            if (target == placeholder or len(placeholder.product_variant_ids) != 1
+                    or placeholder.product_variant_id.id in moved_variant_ids
+                    or placeholder.uom_id.category_id != target.uom_id.category_id):
+                kept |= placeholder
+            else:
+                to_merge.setdefault(target, self.browse())
+                to_merge[target] |= placeholder
+        kept.is_portal_placeholder = False
+
+        merged = self.browse()
+        for target, templates in to_merge.items():
+            templates._merge_portal_placeholders_into(target)
+            merged |= templates
+        merged.write({'active': False, 'is_portal_placeholder': False})
+
+        if len(placeholders) == batch_size:
+            self.env.ref('platinum_proj.cron_merge_portal_placeholders')._trigger()
+        _logger.info("Merged %s portal placeholder products", len(merged))
+        return len(merged)
+
+    def _merge_portal_placeholders_into(self, target):
+        """Move what references these placeholder templates to ``target``"""
+        variants = self.product_variant_ids
+        target_variant = target.product_variant_id
+        self.env['approval.product.line'].search(
+            [('product_id', 'in', variants.ids)]).product_id = target_variant
+        self.env['purchase.order.line'].search(
+            [('product_id', 'in', variants.ids)]).product_id = target_variant
+        self.env['product.supplierinfo'].search(
+            [('product_tmpl_id', 'in', self.ids)]).write({
+                'product_tmpl_id': target.id,
+                'product_id': False,
+            })
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    def init(self):
+        super().init()
+        if not self.env.registry.has_trigram:
+            _logger.warning("pg_trgm is not available, portal product search will not be indexed")
+            return
+        for column in ('default_code', 'barcode'):
+            create_index(
+                self.env.cr,
+                f'product_product_{column}_portal_trgm_idx',
+                self._table,
+                [f'{column} gin_trgm_ops'],
+                method='gin',
+            )
+
+    @api.model
+    def _portal_search_ranked(self, search, limit=10):
+        """Ranked product autocomplete for the employee portal
+
+        Matches ``search`` anywhere in the name, internal reference or
+        barcode (served by the trigram indexes above and by the stock
+        trigram index on ``product_template.name``) and ranks exact
+        reference/barcode matches first, then prefix matches, then by
+        trigram similarity. UoM id and name come from the same query.
+
+        :return: list of dicts with ``id``, ``name``, ``default_code``,
+                 ``uom_id`` and ``uom_name``
+        """
+        if not self.env.registry.has_trigram:
+            return self._portal_search_fallback(search, limit)
+
+        lang = self.env.lang or 'en_US'
+        like = f'%{escape_psql(search)}%'
+        prefix = f'{escape_psql(search)}%'
+        product_name = SQL("COALESCE(pt.name->>%s, pt.name->>'en_US')", lang)
+
+        self.env['product.template'].flush_model(['name', 'uom_id'])
+        self.flush_model(['active', 'default_code', 'barcode', 'product_tmpl_id'])
+        rows = self.env.execute_query(SQL("""
+            SELECT pp.id,
+                   %(product_name)s,
+                   pp.default_code,
+                   uom.id,
+                   COALESCE(uom.name->>%(lang)s, uom.name->>'en_US')
+              FROM product_product pp
+              JOIN product_template pt ON pt.id = pp.product_tmpl_id
+              LEFT JOIN uom_uom uom ON uom.id = pt.uom_id
+             WHERE pp.active
+               AND (pp.default_code ILIKE %(like)s
+                    OR pp.barcode ILIKE %(like)s
+                    OR jsonb_path_query_array(pt.name, '$.*')::text ILIKE %(like)s)
+          ORDER BY CASE
+                       WHEN lower(pp.default_code) = lower(%(search)s) OR pp.barcode = %(search)s THEN 0
+                       WHEN pp.default_code ILIKE %(prefix)s OR %(product_name)s ILIKE %(prefix)s THEN 1
+                       ELSE 2
+                   END,
+                   GREATEST(similarity(%(product_name)s, %(search)s),
+                            similarity(COALESCE(pp.default_code, ''), %(search)s)) DESC,
+                   pp.id
+             LIMIT %(limit)s
+        """, product_name=product_name, lang=lang, like=like, prefix=prefix,
+            search=search, limit=limit))
+
+        return [{
+            'id': product_id,
+            'name': name,
+            'default_code': default_code,
+            'uom_id': uom_id or 1,
+            'uom_name': uom_name or 'Units',
+        } for product_id, name, default_code, uom_id, uom_name in rows]
+
+    @api.model
+    def _find_portal_products(self, names, company=None):
+        """Return ``{name key: product}`` of existing products matching names
+
+        Served by the ``portal_name_key`` index. Only products of ``company``
+        (the current one by default) or shared by all companies match.
+        Catalog products win over placeholders, then the oldest one.
+        """
+        keys = {normalize_name(name) for name in names} - {False}
+        if not keys:
+            return {}
+        company = company or self.env.company
+        products = self.sudo().search([
+            ('product_tmpl_id.portal_name_key', 'in', list(keys)),
+            ('company_id', 'in', [company.id, False]),
+        ])
+        products_by_key = {}
+        for product in products.sorted(lambda p: (p.is_portal_placeholder, p.id)):
+            products_by_key.setdefault(product.portal_name_key, product)
+        return products_by_key
+
+    @api.model
+    def _portal_search_fallback(self, search, limit=10):
+        """Unranked ORM search used when pg_trgm is not installed"""
+        products = self.sudo().search([
+            '|', '|',
+            ('name', 'ilike', search),
+            ('default_code', 'ilike', search),
+            ('barcode', 'ilike', search)
+        ], limit=limit)
+        return [{
+            'id': product.id,
+            'name': product.name,
+            'default_code': product.default_code,
+            'uom_id': product.uom_id.id or 1,
+            'uom_name': product.uom_id.name or 'Units',
+        } for product in products]
@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class PurchaseOrder(models.Model):
+    _inherit = 'purchase.order'
+
+    approval_quotation_ids = fields.Many2many(
+        'ir.attachment',
+        string='Request Quotations',
+        compute='_compute_approval_quotation_ids',
+        help='Quotations attached to the approval requests of this order, shared rather than copied'
+    )
+
+    def _compute_approval_quotation_ids(self):
+        """Collect the quotations of the requests behind each order
+
+        Requests are found through ``purchase_order_id`` (custom and
+        consolidated flows) or through their product lines (approvals_purchase
+        flow), with one search for all orders.
+        """
+        orders = self.filtered('id')
+        requests = self.env['approval.request'].sudo().search([
+            '|',
+            ('purchase_order_id', 'in', orders.ids),
+            ('product_line_ids.purchase_order_line_id.order_id', 'in', orders.ids),
+        ]) if orders else self.env['approval.request']
+        quotations = requests._get_quotation_attachments()
+
+        request_ids_by_order = {}
+        for request in requests:
+            for order in request.purchase_order_id | request.product_line_ids.purchase_order_line_id.order_id:
+                request_ids_by_order.setdefault(order.id, set()).add(request.id)
+
+        for order in self:
+            request_ids = request_ids_by_order.get(order.id, set())
+            order.approval_quotation_ids = quotations.filtered(lambda att: att.res_id in request_ids)
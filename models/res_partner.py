@@ -0,0 +1,167 @@
+# -*- coding: utf-8 -*-
+
+from psycopg2.errors import SerializationFailure, UniqueViolation
+
+from odoo import api, fields, models
+from odoo.tools import SQL
+from odoo.tools.sql import create_index, escape_psql
+
+from ..tools import normalize_name, normalize_vat
+
+
+class ResPartner(models.Model):
+    _inherit = 'res.partner'
+
+    vendor_key = fields.Char(
+        string='Vendor Key',
+        compute='_compute_vendor_key',
+        store=True,
+        index=True,
+        help='Case, accent, punctuation and whitespace folded name used to find duplicate vendors'
+    )
+    vendor_vat_key = fields.Char(
+        string='Vendor VAT Key',
+        compute='_compute_vendor_key',
+        store=True,
+        index='btree_not_null'
+    )
+    is_portal_vendor = fields.Boolean(
+        string='Created from Portal',
+        copy=False,
+        readonly=True,
+        help='Vendor created by a portal submission; unique on its vendor and VAT keys while active'
+    )
+
+    def init(self):
+        super().init()
+        # Concurrent portal submissions cannot create the same vendor twice;
+        # archived, renamed or merged partners follow their stored keys
+        self.env.cr.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS res_partner_portal_vendor_key_uniq
+                ON res_partner (vendor_key, COALESCE(vendor_vat_key, ''))
+             WHERE is_portal_vendor AND active
+        """)
+        if self.env.registry.has_trigram:
+            create_index(
+                self.env.cr,
+                'res_partner_vendor_key_trgm_idx',
+                self._table,
+                ['vendor_key gin_trgm_ops'],
+                method='gin',
+            )
+
+    def write(self, vals):
+        res = super().write(vals)
+        if 'email' in vals and (self.sudo().user_ids or self.sudo().employee_ids):
+            # Employees resolve users by email, see hr.employee._get_employee_id_for_user
+            self.env.registry.clear_cache()
+        return res
+
+    @api.depends('name', 'vat')
+    def _compute_vendor_key(self):
+        for partner in self:
+            partner.vendor_key = normalize_name(partner.name)
+            partner.vendor_vat_key = normalize_vat(partner.vat)
+
+    @api.model
+    def _find_vendor(self, name, vat=None):
+        """Find an existing company by normalized name (and VAT when given)
+
+        Served by the ``vendor_key`` index. A company without VAT matches
+        any VAT, so adding a VAT does not duplicate a known vendor.
+        """
+        key = normalize_name(name)
+        if not key:
+            return self.browse()
+        domain = [('vendor_key', '=', key), ('is_company', '=', True)]
+        vat_key = normalize_vat(vat)
+        if vat_key:
+            domain += ['|', ('vendor_vat_key', '=', vat_key), ('vendor_vat_key', '=', False)]
+        return self.sudo().search(domain, order='supplier_rank desc, id', limit=1)
+
+    @api.model
+    def _find_or_create_vendor(self, name, email=None, phone=None, vat=None):
+        """Return ``(vendor, created)`` for a vendor name, creating it if needed
+
+        Safe under concurrency: created vendors are unique on their keys
+        (``res_partner_portal_vendor_key_uniq``). A concurrent transaction
+        creating the same vendor makes this one wait, then fail on the
+        index; the vendor holding the key is then returned. When this
+        transaction's snapshot cannot see it yet, a serialization failure
+        makes the server retry the whole request, which then finds it.
+        """
+        name = (name or '').strip()
+        vendor = self._find_vendor(name, vat)
+        if vendor:
+            return vendor, False
+
+        vendor_vals = {
+            'name': name,
+            'is_company': True,
+            'is_portal_vendor': True,
+            'supplier_rank': 1,
+            'customer_rank': 0,
+        }
+        if email:
+            vendor_vals['email'] = email
+        if phone:
+            vendor_vals['phone'] = phone
+        if vat:
+            vendor_vals['vat'] = vat
+        try:
+            with self.env.cr.savepoint():
+                vendor = self.sudo().create(vendor_vals)
+        except UniqueViolation:
+            vendor = self.sudo().search([
+                ('vendor_key', '=', normalize_name(name)),
+                ('vendor_vat_key', '=', normalize_vat(vat) or False),
+                ('is_portal_vendor', '=', True),
+            ], limit=1)
+            if not vendor:
+                raise SerializationFailure("Vendor %r created by a concurrent transaction" % name)
+            return vendor, False
+        return vendor, True
+
+    @api.model
+    def _portal_search_vendors_ranked(self, search, limit=10, offset=0):
+        """Ranked vendor autocomplete on the normalized vendor key
+
+        Matches the folded term anywhere in the vendor key (trigram index)
+        or as the exact VAT, ranking exact name/VAT matches first, then
+        prefix matches, then trigram similarity. Only suppliers are
+        returned, one page of ``limit`` from ``offset``.
+        """
+        key = normalize_name(search)
+        vat_key = normalize_vat(search)
+        if not key:
+            return self.browse()
+
+        if not self.env.registry.has_trigram:
+            domain = [('vendor_key', 'ilike', key)]
+            if vat_key:
+                domain = ['|', ('vendor_vat_key', '=', vat_key)] + domain
+            return self.sudo().search([
+                ('is_company', '=', True),
+                ('supplier_rank', '>', 0),
+            ] + domain, limit=limit, offset=offset, order='name, id')
+
+        self.flush_model(['vendor_key', 'vendor_vat_key', 'is_company', 'supplier_rank', 'active'])
+        rows = self.env.execute_query(SQL("""
+            SELECT id
+              FROM res_partner
+             WHERE active
+               AND is_company
+               AND supplier_rank > 0
+               AND (vendor_key ILIKE %(like)s OR vendor_vat_key = %(vat_key)s)
+          ORDER BY CASE
+                       WHEN vendor_key = %(key)s OR vendor_vat_key = %(vat_key)s THEN 0
+                       WHEN vendor_key LIKE %(prefix)s THEN 1
+                       ELSE 2
+                   END,
+                   similarity(vendor_key, %(key)s) DESC,
+                   id
+             LIMIT %(limit)s
+            OFFSET %(offset)s
+        """, like=f'%{escape_psql(key)}%', prefix=f'{escape_psql(key)}%',
+            key=key, vat_key=vat_key or '', limit=limit, offset=offset))
+        return self.sudo().browse([row[0] for row in rows])
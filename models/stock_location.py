@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models
+
+
+class StockLocation(models.Model):
+    _inherit = 'stock.location'
+
+    @api.model
+    def _get_requisition_source_locations(self, company=None):
+        """Internal locations that may serve as requisition source"""
+        company = company or self.env.company
+        return self.sudo().search([
+            ('usage', '=', 'internal'),
+            ('company_id', '=', company.id)
+        ])
+
+    @api.model
+    def _rank_source_locations(self, product_quantities, locations=None, ranking='score'):
+        """Rank candidate source locations for a set of requested products
+
+        Availability for every product across every candidate location is
+        read with one grouped quant query and scored in memory.
+
+        Supported rankings:
+
+        - ``score``: average per line, 1 for full and 0.5 for partial
+          availability (the historical portal behaviour)
+        - ``coverage``: locations covering every line first, then the ones
+          needing the fewest split picks, then by score
+
+        :param product_quantities: list of (product_id, quantity) tuples
+        :param locations: candidate stock.location recordset, defaults to
+                          the internal locations of the current company
+        :param ranking: ``score`` or ``coverage``
+        :return: list of dicts sorted best first, with keys ``location``,
+                 ``score``, ``full_lines``, ``partial_lines``,
+                 ``split_picks`` and ``sequence``
+        """
+        product_quantities = [(pid, qty) for pid, qty in product_quantities if pid]
+        if not product_quantities:
+            return []
+
+        if locations is None:
+            locations = self._get_requisition_source_locations()
+        products = self.env['product.product'].browse(
+            list({pid for pid, _qty in product_quantities})
+        )
+        availability = self.env['stock.quant']._get_available_quantity_map(products, locations)
+
+        total_lines = len(product_quantities)
+        results = []
+        for sequence, location in enumerate(locations):
+            full_lines = partial_lines = 0
+            for product_id, quantity in product_quantities:
+                available_qty = availability.get((product_id, location.id), 0.0)
+                if available_qty >= quantity:
+                    full_lines += 1
+                elif available_qty > 0:
+                    partial_lines += 1
+            results.append({
+                'location': location,
+                'score': (full_lines + 0.5 * partial_lines) / total_lines,
+                'full_lines': full_lines,
+                'partial_lines': partial_lines,
+                'split_picks': total_lines - full_lines,
+                'sequence': sequence,
+            })
+
+        if ranking == 'coverage':
+            def sort_key(res):
+                return (res['split_picks'], -res['score'], res['sequence'])
+        else:
+            def sort_key(res):
+                return (-res['score'], res['sequence'])
+        results.sort(key=sort_key)
+        return results
@@ -0,0 +1,19 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class StockMove(models.Model):
+    _inherit = 'stock.move'
+
+    approval_request_id = fields.Many2one(
+        'approval.request',
+        string='Approval Request',
+        index='btree_not_null',
+        copy=False,
+        help='Stock requisition fulfilled by this move'
+    )
+
+    def _prepare_merge_moves_distinct_fields(self):
+        # Moves of different requests in a wave transfer stay separate
+        return super()._prepare_merge_moves_distinct_fields() + ['approval_request_id']
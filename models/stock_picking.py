@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+from odoo import fields, models
+
+
+class StockPicking(models.Model):
+    _inherit = 'stock.picking'
+
+    approval_request_ids = fields.One2many(
+        'approval.request',
+        'stock_picking_id',
+        string='Approval Requests',
+        help='Stock requisitions fulfilled by this transfer'
+    )
+    is_approval_wave = fields.Boolean(
+        string='Requisition Wave',
+        index='btree_not_null',
+        copy=False,
+        readonly=True,
+        help='Transfer gathering the moves of several approved stock requisitions'
+    )
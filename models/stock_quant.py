@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+
+from odoo import api, models
+from odoo.tools import float_compare
+
+
+class StockQuant(models.Model):
+    _inherit = 'stock.quant'
+
+    @api.model
+    def _get_available_quantity_map(self, products, locations):
+        """Return available quantities for every (product, location) pair
+
+        Set-based equivalent of calling ``_get_available_quantity(product,
+        location, strict=True)`` for each pair: quants without lot, package
+        or owner are summed per product and location in a single grouped
+        query, and negative availability is clamped to zero.
+
+        :param products: product.product recordset
+        :param locations: stock.location recordset
+        :return: dict {(product_id, location_id): available_qty}; pairs
+                 without quants are absent
+        """
+        if not products or not locations:
+            return {}
+
+        groups = self.sudo()._read_group(
+            [
+                ('product_id', 'in', products.ids),
+                ('location_id', 'in', locations.ids),
+                ('lot_id', '=', False),
+                ('package_id', '=', False),
+                ('owner_id', '=', False),
+            ],
+            groupby=['product_id', 'location_id'],
+            aggregates=['quantity:sum', 'reserved_quantity:sum'],
+        )
+
+        availability = {}
+        for product, location, quantity, reserved_quantity in groups:
+            available_qty = quantity - reserved_quantity
+            rounding = product.uom_id.rounding
+            if float_compare(available_qty, 0.0, precision_rounding=rounding) < 0:
+                available_qty = 0.0
+            availability[(product.id, location.id)] = available_qty
+        return availability
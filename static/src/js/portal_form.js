@@ -32,7 +32,8 @@ publicWidget.registry.approvalPortalForm = publicWidget.Widget.extend({
      * @private
      */
     _setupForm: function () {
-        this.$categorySelect = this.$('select[name="category_id"]');
+        this.$categorySelect = this.$('[name="category_id"]');
+        this.etagCache = {};
         this.$amountInput = this.$('input[name="amount"]');
         this.$budgetInfo = this.$('.o_budget_info');
 
@@ -42,6 +43,29 @@ publicWidget.registry.approvalPortalForm = publicWidget.Widget.extend({
         }
     },
 
+    /**
+     * Call a JSON route, reusing the previous result when the server
+     * answers that it has not changed (ETag match)
+     * @private
+     * @param {string} route
+     * @param {Object} params
+     * @returns {Promise}
+     */
+    _rpcWithEtag: function (route, params) {
+        const key = route + JSON.stringify(params);
+        const cached = this.etagCache[key];
+
+        return rpc(route, Object.assign({}, params, {
+            etag: cached ? cached.etag : null,
+        })).then((result) => {
+            if (result.not_modified && cached) {
+                return cached.result;
+            }
+            this.etagCache[key] = {etag: result.etag, result: result};
+            return result;
+        });
+    },
+
     /**
      * Validate budget availability
      * @private
@@ -53,10 +77,11 @@ publicWidget.registry.approvalPortalForm = publicWidget.Widget.extend({
             return Promise.resolve(true);
         }
 
-        return rpc('/my/approval/check_budget', {
+        return this._rpcWithEtag('/my/approval/check_budget', {
             amount: parseFloat(amount),
             category_id: parseInt(categoryId),
         }).then((result) => {
+            this._updateBudgetDisplay(result.budget_info);
             return result.available;
         });
     },
@@ -95,13 +120,15 @@ publicWidget.registry.approvalPortalForm = publicWidget.Widget.extend({
         const categoryId = this.$categorySelect.val();
         if (categoryId) {
             // Fetch budget information for the selected category
-            rpc('/my/approval/category_info', {
+            this._rpcWithEtag('/my/approval/category_info', {
                 category_id: parseInt(categoryId),
             }).then((result) => {
                 this._updateBudgetDisplay(result.budget_info);
 
                 // Show/hide fields based on category configuration
-                this._toggleFieldVisibility(result.category_config);
+                if (result.category_config && Object.keys(result.category_config).length) {
+                    this._toggleFieldVisibility(result.category_config);
+                }
             });
         }
     },
@@ -425,7 +452,7 @@ publicWidget.registry.productLinesManager = publicWidget.Widget.extend({
             this._checkStockAvailability(this.selectedProduct.id, quantity).then((result) => {
                 if (!result.available) {
                     const message = `Insufficient stock for ${result.product_name}.\n` +
-                                  `Requested: ${quantity}, Available: ${result.total_available}`;
+                                  `Requested: ${result.requested_qty || quantity}, Available: ${result.total_available}`;
                     if (confirm(message + '\n\nDo you want to proceed anyway?')) {
                         this._addItemToList(description, quantity, price, vendorId, vendorName);
                     }
@@ -603,6 +630,7 @@ publicWidget.registry.productLinesManager = publicWidget.Widget.extend({
 
         this.items.forEach((item, index) => {
             $hiddenInputs.append(`
+                <input type="hidden" name="product_line_key[]" value="${item.line_key || ''}">
                 <input type="hidden" name="product_id[]" value="${item.id || ''}">
                 <input type="hidden" name="product_name[]" value="${item.name}">
                 <input type="hidden" name="product_description[]" value="${item.description}">
@@ -746,20 +774,40 @@ publicWidget.registry.productLinesManager = publicWidget.Widget.extend({
     },
 
     /**
-     * Check stock availability for a product
+     * Check stock availability for a product, together with the lines of
+     * the same product already in the list so their quantities add up.
+     * Other lines do not affect the result and are not sent.
      * @private
      * @param {int} productId
      * @param {float} quantity
      * @returns {Promise}
      */
     _checkStockAvailability: function (productId, quantity) {
-        return rpc('/my/approval/check_stock_availability', {
-            product_id: productId,
-            quantity: quantity || 1
+        const lines = this.items
+            .filter(item => !item.is_new && String(item.id) === String(productId))
+            .map(item => ({product_id: item.id, quantity: item.quantity}));
+        lines.push({product_id: productId, quantity: quantity || 1});
+
+        return this._checkStockAvailabilityBatch(lines).then((result) => {
+            return result.products[productId] || {available: false, locations: []};
+        });
+    },
+
+    /**
+     * Check stock availability for several lines at once
+     * @private
+     * @param {Array} lines list of {product_id, quantity}
+     * @returns {Promise}
+     */
+    _checkStockAvailabilityBatch: function (lines) {
+        return rpc('/my/approval/check_stock_availability_batch', {
+            lines: lines
         });
     },
 });
 
+const VENDOR_PAGE_SIZE = 8;
+
 /**
  * Vendor Search Manager for procurement requests
  */
@@ -768,6 +816,7 @@ publicWidget.registry.vendorSearchManager = publicWidget.Widget.extend({
     events: {
         'input #vendor_search': '_onVendorSearch',
         'click .vendor-suggestion': '_onVendorSelect',
+        'mousedown .vendor-load-more': '_onVendorLoadMore',
         'click #clear_vendor_btn': '_onClearVendor',
         'click #create_vendor_btn': '_onCreateVendor',
         'click #cancel_vendor_btn': '_onCancelVendorForm',
@@ -782,6 +831,18 @@ publicWidget.registry.vendorSearchManager = publicWidget.Widget.extend({
         var def = this._super.apply(this, arguments);
         this.searchTimeout = null;
         this.selectedVendor = null;
+        this.searchTerm = '';
+        this.searchOffset = 0;
+
+        // The selected vendor is the only one rendered server-side
+        const partnerId = parseInt(this.$('#selected_partner_id').val());
+        if (partnerId) {
+            this.selectedVendor = {
+                id: partnerId,
+                name: this.$('#vendor_name_hidden').val(),
+                existing: true
+            };
+        }
         return def;
     },
 
@@ -812,12 +873,18 @@ publicWidget.registry.vendorSearchManager = publicWidget.Widget.extend({
      * Perform vendor search via RPC
      * @private
      */
-    _performVendorSearch: function (searchTerm) {
+    _performVendorSearch: function (searchTerm, offset = 0) {
+        this.searchTerm = searchTerm;
+        this.searchOffset = offset;
         rpc('/my/approval/search_vendors', {
             search: searchTerm,
-            limit: 8
+            limit: VENDOR_PAGE_SIZE,
+            offset: offset
         }).then((result) => {
-            this._renderSearchResults(result.vendors, searchTerm);
+            if (searchTerm !== this.searchTerm) {
+                return;
+            }
+            this._renderSearchResults(result.vendors, searchTerm, result.has_more, offset > 0);
         }).catch(() => {
             this.$('#vendor_suggestions').hide();
         });
@@ -827,9 +894,13 @@ publicWidget.registry.vendorSearchManager = publicWidget.Widget.extend({
      * Render search results
      * @private
      */
-    _renderSearchResults: function (vendors, searchTerm) {
+    _renderSearchResults: function (vendors, searchTerm, hasMore = false, append = false) {
         const $suggestions = this.$('#vendor_suggestions');
-        $suggestions.empty();
+        if (append) {
+            $suggestions.find('.vendor-load-more, [data-create-vendor]').remove();
+        } else {
+            $suggestions.empty();
+        }
 
         if (vendors && vendors.length > 0) {
             vendors.forEach(vendor => {
@@ -854,6 +925,14 @@ publicWidget.registry.vendorSearchManager = publicWidget.Widget.extend({
             });
         }
 
+        if (hasMore) {
+            $suggestions.append($(`
+                <div class="vendor-load-more p-2 border-bottom text-center text-muted" style="cursor: pointer;">
+                    <small>Load more vendors...</small>
+                </div>
+            `));
+        }
+
         // Add "Create new vendor" option
         const $createItem = $(`
             <div class="vendor-suggestion p-2 text-primary bg-light" style="cursor: pointer;"
@@ -866,6 +945,16 @@ publicWidget.registry.vendorSearchManager = publicWidget.Widget.extend({
         $suggestions.show();
     },
 
+    /**
+     * Fetch the next page of the current search
+     * @private
+     */
+    _onVendorLoadMore: function (ev) {
+        // Keep the focus in the search input so the suggestions stay open
+        ev.preventDefault();
+        this._performVendorSearch(this.searchTerm, this.searchOffset + VENDOR_PAGE_SIZE);
+    },
+
     /**
      * Handle vendor selection
      * @private
@@ -1052,33 +1141,64 @@ publicWidget.registry.approvalStatusWidget = publicWidget.Widget.extend({
     },
 
     /**
-     * Setup status display with auto-refresh
+     * Setup status display: bus notifications when available, polling otherwise
      * @private
      */
     _setupStatusDisplay: function () {
-        // Auto-refresh status every 30 seconds for pending requests
-        if (this.$el.data('status') === 'pending') {
-            setInterval(() => {
+        // Only pending requests still change
+        if (this.$el.data('status') !== 'pending') {
+            return;
+        }
+        this.requestId = parseInt(this.$el.data('request-id'));
+        this.version = parseInt(this.$el.data('version')) || 0;
+
+        try {
+            const busService = this.bindService("bus_service");
+            busService.subscribe("platinum_proj.approval_status", (payload) => {
+                this._onStatusChanges(payload.requests || []);
+            });
+            busService.start();
+        } catch {
+            // No bus on this page: poll every 30 seconds
+            this.pollInterval = setInterval(() => {
                 this._refreshStatus();
             }, 30000);
         }
     },
 
     /**
-     * Refresh approval status
+     * @override
+     */
+    destroy: function () {
+        clearInterval(this.pollInterval);
+        this._super.apply(this, arguments);
+    },
+
+    /**
+     * Ask for the requests changed since the versions this page shows
      * @private
      */
     _refreshStatus: function () {
-        const requestId = this.$el.data('request-id');
-        if (requestId) {
+        if (this.requestId) {
             rpc('/my/approval/status', {
-                request_id: parseInt(requestId),
+                versions: {[this.requestId]: this.version},
             }).then((result) => {
-                if (result.status !== this.$el.data('status')) {
-                    // Reload page if status changed
-                    window.location.reload();
-                }
+                this._onStatusChanges(result.requests);
             });
         }
     },
+
+    /**
+     * @private
+     * @param {Object[]} requests changed requests ({id, version, status, approvers})
+     */
+    _onStatusChanges: function (requests) {
+        const change = requests.find((r) => r.id === this.requestId);
+        if (!change || change.version === this.version) {
+            return;
+        }
+        this.version = change.version;
+        // Reload to show the new status and approvers
+        window.location.reload();
+    },
 });
\ No newline at end of file
@@ -0,0 +1,4 @@
+# -*- coding: utf-8 -*-
+
+from . import test_employee_resolution
+from . import test_ir_attachment
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from odoo.tests import TransactionCase, new_test_user, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestEmployeeResolution(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.portal_user = new_test_user(
+            cls.env, login='portal_employee', groups='base.group_portal', email='worker@example.com')
+        cls.internal_user = new_test_user(
+            cls.env, login='internal_employee', groups='base.group_user', email='office@example.com')
+        cls.email_employee = cls.env['hr.employee'].create({
+            'name': 'Portal Worker',
+            'work_email': 'worker@example.com',
+        })
+        cls.linked_employee = cls.env['hr.employee'].create({
+            'name': 'Office Worker',
+            'user_id': cls.internal_user.id,
+        })
+        # Shares the internal user's email, loses to the direct link
+        cls.env['hr.employee'].create({
+            'name': 'Office Homonym',
+            'work_email': 'office@example.com',
+        })
+
+    def test_user_link_wins_over_email(self):
+        Employee = self.env['hr.employee']
+        users = self.portal_user | self.internal_user
+        self.assertEqual(Employee._get_employee_ids_for_users(users), {
+            self.portal_user.id: self.email_employee.id,
+            self.internal_user.id: self.linked_employee.id,
+        })
+        self.assertEqual(Employee._get_employee_for_user(self.portal_user), self.email_employee)
+
+    def test_user_link_only(self):
+        result = self.env['hr.employee']._get_employee_ids_for_users(self.portal_user, match_email=False)
+        self.assertEqual(result, {self.portal_user.id: False})
+
+    def test_cached_resolution_follows_employee_changes(self):
+        Employee = self.env['hr.employee']
+        self.assertEqual(Employee._get_employee_for_user(self.portal_user), self.email_employee)
+
+        self.email_employee.work_email = 'someone.else@example.com'
+        self.assertFalse(Employee._get_employee_for_user(self.portal_user))
+
+        linked = Employee.create({'name': 'Portal Worker (linked)', 'user_id': self.portal_user.id})
+        self.assertEqual(Employee._get_employee_for_user(self.portal_user), linked)
+
+    def test_cached_resolution_follows_user_email(self):
+        Employee = self.env['hr.employee']
+        self.assertEqual(Employee._get_employee_for_user(self.portal_user), self.email_employee)
+
+        self.portal_user.email = 'moved@example.com'
+        self.assertFalse(Employee._get_employee_for_user(self.portal_user))
+
+    def test_request_employee(self):
+        category = self.env['approval.category'].create({'name': 'Office Supplies'})
+        requests = self.env['approval.request'].create([{
+            'name': 'Chairs',
+            'category_id': category.id,
+            'request_owner_id': user.id,
+        } for user in (self.portal_user, self.internal_user)])
+        self.assertEqual(requests.mapped('employee_id'), self.email_employee | self.linked_employee)
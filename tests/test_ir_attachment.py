@@ -0,0 +1,54 @@
+# -*- coding: utf-8 -*-
+
+import io
+import os
+import stat
+import uuid
+
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestAttachmentStream(TransactionCase):
+
+    def _create_from_stream(self, content, chunk_size=4):
+        return self.env['ir.attachment']._create_from_stream(io.BytesIO(content), {
+            'name': 'quotation.txt',
+            'res_model': 'res.partner',
+            'res_id': self.env.user.partner_id.id,
+        }, chunk_size=chunk_size)
+
+    def test_stream_upload_content(self):
+        content = b'Quotation for 12 chairs\n' * 10
+        attachment = self._create_from_stream(content)
+        attachment.invalidate_recordset()
+
+        self.assertEqual(attachment.raw, content)
+        self.assertEqual(attachment.file_size, len(content))
+        self.assertEqual(attachment.mimetype, 'text/plain')
+        if attachment._storage() == 'file':
+            self.assertTrue(attachment.store_fname)
+
+    def test_stream_upload_file_mode(self):
+        if self.env['ir.attachment']._storage() != 'file':
+            self.skipTest("Attachments are stored in the database")
+        streamed = self._create_from_stream(uuid.uuid4().bytes)
+        written = self.env['ir.attachment'].create({'name': 'written.bin', 'raw': uuid.uuid4().bytes})
+
+        def mode(attachment):
+            return stat.S_IMODE(os.stat(attachment._full_path(attachment.store_fname)).st_mode)
+        self.assertEqual(mode(streamed), mode(written))
+
+    def test_stream_upload_shared_content(self):
+        content = b'Same quotation twice'
+        first = self._create_from_stream(content)
+        second = self._create_from_stream(content)
+        second.invalidate_recordset()
+
+        self.assertEqual(first.store_fname, second.store_fname)
+        self.assertEqual(second.raw, content)
+
+    def test_stream_upload_empty(self):
+        attachment = self._create_from_stream(b'')
+        self.assertEqual(attachment.raw, b'')
+        self.assertEqual(attachment.file_size, 0)
@@ -0,0 +1,3 @@
+# -*- coding: utf-8 -*-
+
+from .normalize import normalize_name, normalize_vat
@@ -0,0 +1,21 @@
+# -*- coding: utf-8 -*-
+
+import re
+import unicodedata
+
+
+def normalize_name(name):
+    """Fold case, accents, punctuation and whitespace of a name"""
+    if not name:
+        return False
+    name = unicodedata.normalize('NFKD', name)
+    name = ''.join(char for char in name if not unicodedata.combining(char))
+    name = re.sub(r'[\W_]+', ' ', name.casefold())
+    return ' '.join(name.split()) or False
+
+
+def normalize_vat(vat):
+    """Keep only the alphanumeric characters of a VAT number, uppercased"""
+    if not vat:
+        return False
+    return re.sub(r'[\W_]+', '', vat).upper() or False